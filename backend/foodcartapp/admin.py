@@ -1,4 +1,7 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.forms.models import BaseInlineFormSet
 from django.shortcuts import reverse, redirect
 from django.templatetags.static import static
 from django.utils.html import format_html
@@ -10,7 +13,10 @@ from .models import Restaurant
 from .models import RestaurantMenuItem
 from .models import Order
 from .models import OrderDetails
+from .models import OrderStatusTransition
+from locations.geocoder import fetch_coordinates
 from locations.models import AddressCache
+from restaurateur.assignment import assign_raw_orders
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -30,10 +36,20 @@ class RestaurantAdmin(admin.ModelAdmin):
         'address',
         'contact_phone',
     ]
+    readonly_fields = [
+        'lat',
+        'lon',
+    ]
     inlines = [
         RestaurantMenuItemInline
     ]
 
+    def save_model(self, request, obj, form, change):
+        if not change or 'address' in form.changed_data:
+            coordinates = fetch_coordinates(settings.GEO_API_KEY, obj.address)
+            obj.lon, obj.lat = coordinates or (None, None)
+        super().save_model(request, obj, form, change)
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -109,13 +125,114 @@ class ProductAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):    pass
 
 
+class PreloadedModelChoiceField(forms.ModelChoiceField):
+    """Ищет объект среди загруженных формсетом заранее, а не запросом на каждую строку."""
+    objects_by_pk = None
+
+    def to_python(self, value):
+        if self.objects_by_pk is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.objects_by_pk[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+
+class OrderDetailsForm(forms.ModelForm):
+    product = PreloadedModelChoiceField(queryset=Product.objects.all(), label='Товар')
+
+    class Meta:
+        model = OrderDetails
+        fields = ['product', 'quantity', 'price']
+        # Товар ищет поле формы среди загруженных заранее, а модель проверяла бы
+        # ключ отдельным запросом на каждую строку. Админка учитывает Meta.exclude
+        # при сборке формсета, поэтому товар подставляется в экземпляр в clean().
+        exclude = ['product']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.product_id is not None:
+            self.initial.setdefault('product', self.instance.product_id)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('product') is not None:
+            self.instance.product = cleaned_data['product']
+        return cleaned_data
+
+
+class OrderDetailsFormSet(BaseInlineFormSet):
+    """Загружает товары и строки заказа двумя запросами на весь формсет."""
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        id_field = form.fields['id']
+        form.fields['id'] = PreloadedModelChoiceField(
+            id_field.queryset,
+            initial=id_field.initial,
+            required=False,
+            widget=id_field.widget,
+        )
+
+    def full_clean(self):
+        if self.is_bound:
+            product_ids = set()
+            for form in self.forms:
+                try:
+                    product_ids.add(int(form.data.get(form.add_prefix('product'))))
+                except (TypeError, ValueError):
+                    continue
+            products = Product.objects.in_bulk(product_ids)
+            details = {detail.pk: detail for detail in self.get_queryset()}
+            for form in self.forms:
+                form.fields['product'].objects_by_pk = products
+                form.fields['id'].objects_by_pk = details
+        super().full_clean()
+
+
 class OrderDetailsInline(admin.TabularInline):
     model = OrderDetails
+    form = OrderDetailsForm
+    formset = OrderDetailsFormSet
     extra = 0
 
 
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        if self.instance.pk and status != self.instance.status and not self.instance.can_change_status(status):
+            raise forms.ValidationError(
+                'Нельзя перевести заказ из статуса «%(current)s» в «%(status)s»',
+                params={
+                    'current': self.instance.get_status_display(),
+                    'status': dict(Order.PROCESSING_STATUS_CHOICES)[status],
+                },
+            )
+        return status
+
+
+class OrderStatusTransitionInline(admin.TabularInline):
+    model = OrderStatusTransition
+    fields = ['from_status', 'to_status', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
     fields = [
         'address',
         'status',
@@ -125,24 +242,41 @@ class OrderAdmin(admin.ModelAdmin):
         'phonenumber',
         'comment',
         'restaurant',
+        'total_price',
         'registered_at',
         'called_at',
         'delivered_at'
     ]
-    inlines = [OrderDetailsInline]
+    readonly_fields = ['total_price']
+    inlines = [OrderDetailsInline, OrderStatusTransitionInline]
+    actions = ['assign_restaurants']
+
+
+    @admin.action(description='Назначить рестораны необработанным заказам')
+    def assign_restaurants(self, request, queryset):
+        assigned, unassigned = assign_raw_orders(queryset)
+        self.message_user(
+            request,
+            f'Назначено заказов: {assigned}, осталось без ресторана: {unassigned}',
+        )
 
 
     def save_formset(self, request, form, formset, change):
-        instances = formset.save(commit=False)
+        if formset.model is not OrderDetails:
+            return super().save_formset(request, form, formset, change)
 
-        for obj in formset.deleted_objects:
-            obj.delete()
+        formset.save(commit=False)
+        OrderDetails.objects.filter(pk__in=[obj.pk for obj in formset.deleted_objects]).delete()
 
-        for instance in instances:
+        # Цена фиксируется на момент правки строки, товары уже загружены формсетом
+        changed_details = [instance for instance, _ in formset.changed_objects]
+        for instance in formset.new_objects + changed_details:
             instance.price = instance.product.price
-            instance.save()
+        OrderDetails.objects.bulk_create(formset.new_objects)
+        OrderDetails.objects.bulk_update(changed_details, ['product', 'quantity', 'price'])
 
         formset.save_m2m()
+        Order.objects.filter(pk=form.instance.pk).recalculate_total_price()
 
 
     def response_change(self, request, obj):
@@ -158,12 +292,33 @@ class OrderAdmin(admin.ModelAdmin):
 
 
     def save_model(self, request, obj, form, change):
-        if change:
-            if not form.initial.get('restaurant') and obj.restaurant:
-                obj.status = 'assembled'
+        if not change:
+            super().save_model(request, obj, form, change)
+            OrderStatusTransition.objects.create(order=obj, to_status=obj.status)
+            return
+
+        status = obj.status
+        obj.status = form.initial['status']
+        if not form.initial.get('restaurant') and obj.restaurant and status == 'raw':
+            status = 'assembled'
+        transition = obj.change_status(status) if status != obj.status else None
         super().save_model(request, obj, form, change)
+        if transition:
+            transition.save()
 
 
 @admin.register(AddressCache)
 class AddressCacheAdmin(admin.ModelAdmin):
-    pass
+    list_display = [
+        'address',
+        'lat',
+        'lon',
+        'status',
+        'updated_at',
+    ]
+    list_filter = [
+        'status',
+    ]
+    search_fields = [
+        'address',
+    ]
@@ -0,0 +1,104 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from foodcartapp.catalogue import abuild_catalogue, aget_cached_catalogue, aget_catalogue_page
+from foodcartapp.models import IdempotencyKey, Product
+from foodcartapp.serializers import OrderSerializer, ProductPageSerializer, collect_product_ids
+from foodcartapp.streaming import dump_json
+from foodcartapp.views import (
+    IDEMPOTENCY_KEY_ERRORS,
+    get_banners,
+    get_catalogue_etag,
+    get_catalogue_last_modified,
+    is_valid_idempotency_key,
+    save_order,
+)
+from locations.geocoder import ageocode_in_background
+
+
+async def banners_list_api(request):
+    return JsonResponse(get_banners(), safe=False, json_dumps_params={
+        'ensure_ascii': False,
+        'indent': 4,
+    })
+
+
+async def product_list_api(request):
+    if request.GET.keys() & ProductPageSerializer().fields.keys():
+        return await product_page_api(request)
+    # Каталог собирается целиком до проверки условий, так что ETag есть и у первого ответа
+    request.catalogue = await aget_cached_catalogue() or await abuild_catalogue()
+    return await product_catalogue_api(request)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=get_catalogue_etag, last_modified_func=get_catalogue_last_modified)
+async def product_catalogue_api(request):
+    return HttpResponse(request.catalogue['body'], content_type='application/json')
+
+
+async def product_page_api(request):
+    serializer = ProductPageSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400, json_dumps_params={
+            'ensure_ascii': False,
+        })
+    return HttpResponse(
+        dump_json(await aget_catalogue_page(**serializer.validated_data)),
+        content_type='application/json',
+    )
+
+
+def parse_request_data(request):
+    """Разбирает тело запроса парсерами DRF, как синхронное API: те же типы
+    содержимого и те же ошибки. Тело уже прочитано сервером ASGI, разбор
+    не ждёт сети.
+    """
+    parsers = [parser_class() for parser_class in api_settings.DEFAULT_PARSER_CLASSES]
+    return Request(request, parsers=parsers).data
+
+
+# Отличия от синхронного register_order: ответы всегда в JSON, без выбора
+# формата по Accept, и без проверки CSRF для сессий — DRF проверяет её только
+# у вошедших в админку, а API вызывает анонимный фронтенд
+@csrf_exempt
+@require_POST
+async def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        if not is_valid_idempotency_key(idempotency_key):
+            return JsonResponse(IDEMPOTENCY_KEY_ERRORS, status=400)
+        stored_response = await (
+            IdempotencyKey.objects
+            .filter(key=idempotency_key)
+            .values_list('response', flat=True)
+            .afirst()
+        )
+        if stored_response is not None:
+            return JsonResponse(stored_response, json_dumps_params={'ensure_ascii': False})
+
+    try:
+        data = parse_request_data(request)
+    except APIException as e:
+        return JsonResponse({'detail': e.detail}, status=e.status_code, json_dumps_params={
+            'ensure_ascii': False,
+        })
+
+    # Товары загружаются заранее, чтобы валидация не ходила в БД синхронно
+    products = await Product.objects.ain_bulk(collect_product_ids([data]))
+    serializer = OrderSerializer(data=data, context={'products': products})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400, json_dumps_params={
+            'ensure_ascii': False,
+        })
+
+    order, response_data = await sync_to_async(save_order)(serializer, idempotency_key)
+    if order:
+        await ageocode_in_background(order.address)
+    return JsonResponse(response_data, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodcartapp.models import RestaurantMenuItem
+
+
+AVAILABILITY_INDEX_CACHE_KEY = 'foodcartapp:availability_index:v2'
+
+
+def build_availability_index():
+    """Строит индекс доступности товаров в ресторанах.
+
+    restaurant_ids — id ресторанов, где что-то есть в продаже, по возрастанию,
+    masks — {id товара: битовая маска ресторанов, где он в продаже}. Бит маски —
+    позиция ресторана в restaurant_ids, поэтому ширина маски зависит от числа
+    ресторанов, а не от величины их id.
+    """
+    menu_items = list(
+        RestaurantMenuItem.objects
+        .filter(availability=True)
+        .values_list('product_id', 'restaurant_id')
+    )
+    restaurant_ids = sorted({restaurant_id for _, restaurant_id in menu_items})
+    columns = {restaurant_id: column for column, restaurant_id in enumerate(restaurant_ids)}
+
+    masks = defaultdict(int)
+    for product_id, restaurant_id in menu_items:
+        masks[product_id] |= 1 << columns[restaurant_id]
+    return {'restaurant_ids': restaurant_ids, 'masks': dict(masks)}
+
+
+def get_availability_index():
+    index = cache.get(AVAILABILITY_INDEX_CACHE_KEY)
+    if index is None:
+        index = build_availability_index()
+        cache.set(
+            AVAILABILITY_INDEX_CACHE_KEY,
+            index,
+            settings.AVAILABILITY_INDEX_CACHE_TIMEOUT,
+        )
+    return index
+
+
+def invalidate_availability_index():
+    cache.delete(AVAILABILITY_INDEX_CACHE_KEY)
+
+
+def get_restaurants_mask(index, product_ids):
+    """Маска ресторанов, которые могут приготовить все перечисленные товары."""
+    if not product_ids:
+        return 0
+    mask = -1
+    for product_id in product_ids:
+        mask &= index['masks'].get(product_id, 0)
+    return mask
+
+
+def iter_mask_columns(mask):
+    """Позиции установленных битов маски, то есть номера ресторанов в индексе."""
+    while mask:
+        lowest_bit = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
+
+
+def iter_restaurant_ids(index, mask):
+    for column in iter_mask_columns(mask):
+        yield index['restaurant_ids'][column]
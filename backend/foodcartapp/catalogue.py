@@ -0,0 +1,126 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from foodcartapp.models import Product
+from foodcartapp.streaming import iter_json_array
+
+
+CATALOGUE_VERSION_KEY = 'foodcartapp:catalogue:version'
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+
+
+def get_catalogue_key(version):
+    return f'foodcartapp:catalogue:{version}'
+
+
+def get_catalogue_version():
+    return cache.get(CATALOGUE_VERSION_KEY, '')
+
+
+def get_cached_catalogue():
+    return cache.get(get_catalogue_key(get_catalogue_version()))
+
+
+async def aget_cached_catalogue():
+    version = await cache.aget(CATALOGUE_VERSION_KEY, '')
+    return await cache.aget(get_catalogue_key(version))
+
+
+def make_catalogue(body):
+    return {
+        'body': body,
+        'etag': hashlib.md5(body, usedforsecurity=False).hexdigest(),
+        'last_modified': timezone.now(),
+    }
+
+
+def stream_catalogue():
+    """Отдаёт каталог кусками и по окончании кладёт его целиком в кэш.
+
+    Каталог кладётся под версию, прочитанную до выборки товаров: если товары
+    изменятся, пока каталог отдаётся, версия сменится и устаревший каталог
+    никто не прочтёт.
+    """
+    version = get_catalogue_version()
+    products = (
+        Product.objects
+        .select_related('category')
+        .available()
+        .iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+    )
+    chunks = []
+    for chunk in iter_json_array(products, serialize_product):
+        chunks.append(chunk)
+        yield chunk
+
+    catalogue = make_catalogue(b''.join(chunks))
+    cache.set(get_catalogue_key(version), catalogue, settings.CATALOGUE_CACHE_TIMEOUT)
+
+
+async def abuild_catalogue():
+    """Собирает каталог асинхронным ORM, кладёт его в кэш и возвращает."""
+    version = await cache.aget(CATALOGUE_VERSION_KEY, '')
+    products = [
+        product async for product in
+        Product.objects.select_related('category').available()
+    ]
+    catalogue = make_catalogue(b''.join(iter_json_array(products, serialize_product)))
+    await cache.aset(get_catalogue_key(version), catalogue, settings.CATALOGUE_CACHE_TIMEOUT)
+    return catalogue
+
+
+def get_catalogue_page_products(limit, after=None, category=None, special_status=None):
+    products = Product.objects.select_related('category').available().order_by('id')
+    if after is not None:
+        products = products.filter(id__gt=after)
+    if category is not None:
+        products = products.filter(category_id=category)
+    if special_status is not None:
+        products = products.filter(special_status=special_status)
+    return products[:limit + 1]
+
+
+def make_catalogue_page(products, limit):
+    has_next_page = len(products) > limit
+    products = products[:limit]
+    return {
+        'results': [serialize_product(product) for product in products],
+        'next_cursor': products[-1].id if has_next_page else None,
+    }
+
+
+def get_catalogue_page(limit, **filters):
+    """Страница каталога по курсору: товары с id больше after, не более limit штук."""
+    products = list(get_catalogue_page_products(limit, **filters))
+    return make_catalogue_page(products, limit)
+
+
+async def aget_catalogue_page(limit, **filters):
+    products = [product async for product in get_catalogue_page_products(limit, **filters)]
+    return make_catalogue_page(products, limit)
+
+
+def invalidate_catalogue():
+    cache.set(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, None)
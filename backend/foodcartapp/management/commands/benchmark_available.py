@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Product, Restaurant, RestaurantMenuItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает старый (IN-подзапрос) и новый (EXISTS) запрос доступных товаров '
+        'на синтетических данных. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--restaurants', type=int, default=500)
+        parser.add_argument(
+            '--density',
+            type=float,
+            default=0.1,
+            help='Доля товаров в меню каждого ресторана',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options)
+            queries = {
+                'IN-подзапрос': Product.objects.filter(
+                    pk__in=(
+                        RestaurantMenuItem.objects
+                        .filter(availability=True)
+                        .values_list('product')
+                    ),
+                ),
+                'EXISTS': Product.objects.available(),
+            }
+            for title, queryset in queries.items():
+                self.report(title, queryset, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        random.seed(options['seed'])
+        self.stdout.write('Создаю тестовые данные...')
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(name=f'Ресторан {number}')
+            for number in range(options['restaurants'])
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f'Товар {number}', price=100, image='benchmark.jpg')
+            for number in range(options['products'])
+        )
+        menu_size = int(len(products) * options['density'])
+        for restaurant in restaurants:
+            RestaurantMenuItem.objects.bulk_create(
+                (
+                    RestaurantMenuItem(
+                        restaurant=restaurant,
+                        product=product,
+                        availability=random.random() < 0.8,
+                    )
+                    for product in random.sample(products, menu_size)
+                ),
+                batch_size=5000,
+            )
+        self.stdout.write(
+            f'Ресторанов: {len(restaurants)}, товаров: {len(products)}, '
+            f'пунктов меню: {menu_size * len(restaurants)}'
+        )
+
+    def report(self, title, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            count = len(list(queryset.values_list('id', flat=True)))
+            timings.append(time.perf_counter() - started_at)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}'))
+        self.stdout.write(
+            f'товаров: {count}, лучшее время: {min(timings) * 1000:.1f} мс, '
+            f'среднее: {sum(timings) / len(timings) * 1000:.1f} мс'
+        )
+        self.stdout.write(queryset.explain())
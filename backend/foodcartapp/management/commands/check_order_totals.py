@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сохранённую стоимость заказов с суммой по их составу'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересчитать стоимость расходящихся заказов',
+        )
+
+    def handle(self, *args, **options):
+        mismatched_ids = list(
+            Order.objects
+            .with_calculated_total_price()
+            .exclude(total_price=F('calculated_total_price'))
+            .values_list('id', flat=True)
+        )
+        if not mismatched_ids:
+            self.stdout.write('Стоимость всех заказов совпадает с их составом')
+            return
+
+        if not options['fix']:
+            raise CommandError(
+                f'Стоимость расходится у заказов: {len(mismatched_ids)}, '
+                f'например {mismatched_ids[:10]}. Запустите с --fix для пересчёта'
+            )
+
+        fixed = Order.objects.filter(id__in=mismatched_ids).recalculate_total_price()
+        self.stdout.write(f'Пересчитана стоимость заказов: {fixed}')
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Restaurant
+from locations.geocoder import fetch_coordinates_bulk
+
+
+class Command(BaseCommand):
+    help = 'Заполняет координаты ресторанов по их адресам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перегеокодировать все рестораны, а не только без координат',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.exclude(address='')
+        if not options['all']:
+            restaurants = restaurants.filter(lat__isnull=True)
+        restaurants = list(restaurants)
+
+        coordinates = fetch_coordinates_bulk(
+            settings.GEO_API_KEY,
+            [restaurant.address for restaurant in restaurants],
+        )
+        for restaurant in restaurants:
+            restaurant.lon, restaurant.lat = coordinates.get(restaurant.address) or (None, None)
+
+        Restaurant.objects.bulk_update(restaurants, ['lat', 'lon'])
+
+        located = sum(1 for restaurant in restaurants if restaurant.lat is not None)
+        self.stdout.write(f'Обработано ресторанов: {len(restaurants)}, с координатами: {located}')
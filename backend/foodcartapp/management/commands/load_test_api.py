@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import httpx
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает API запущенного сервера параллельными запросами и печатает '
+        'пропускную способность и задержки. Запустите его против gunicorn (WSGI) '
+        'и uvicorn (ASGI), чтобы сравнить режимы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', default='/api/products/')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--order',
+            action='store_true',
+            help='Отправлять POST с заказом на /api/order/ вместо GET на --path',
+        )
+        parser.add_argument(
+            '--address',
+            default='Москва, Красная площадь, 1',
+            help='Адрес заказов в режиме --order',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть положительными')
+
+        if options['order']:
+            product_ids = list(Product.objects.available().values_list('id', flat=True)[:3])
+            if not product_ids:
+                raise CommandError('Нет доступных товаров для заказов')
+            method, path = 'POST', '/api/order/'
+            body = {
+                'products': [{'product': product_id, 'quantity': 1} for product_id in product_ids],
+                'firstname': 'Нагрузка',
+                'lastname': 'Тест',
+                'phonenumber': '+79991234567',
+                'address': options['address'],
+            }
+        else:
+            method, path, body = 'GET', options['path'], None
+
+        latencies, statuses, elapsed = asyncio.run(self.run_load(method, path, body, options))
+        self.report(method, path, latencies, statuses, elapsed, options)
+
+    async def run_load(self, method, path, body, options):
+        latencies = []
+        statuses = {}
+        remaining = iter(range(options['requests']))
+
+        async def worker(client):
+            for _ in remaining:
+                started_at = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    status = response.status_code
+                except httpx.HTTPError as error:
+                    status = type(error).__name__
+                latencies.append(time.perf_counter() - started_at)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        limits = httpx.Limits(
+            max_connections=options['concurrency'],
+            max_keepalive_connections=options['concurrency'],
+        )
+        async with httpx.AsyncClient(
+            base_url=options['base_url'],
+            timeout=options['timeout'],
+            limits=limits,
+        ) as client:
+            started_at = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(options['concurrency'])))
+            elapsed = time.perf_counter() - started_at
+        return latencies, statuses, elapsed
+
+    def report(self, method, path, latencies, statuses, elapsed, options):
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        errors = sum(
+            count for status, count in statuses.items()
+            if not isinstance(status, int) or status >= 400
+        )
+        self.stdout.write(
+            f'{method} {options["base_url"]}{path}: '
+            f'{len(latencies)} запросов, параллельно {options["concurrency"]}'
+        )
+        self.stdout.write(f'  время: {elapsed:.2f} с, {len(latencies) / elapsed:.1f} запросов/с')
+        self.stdout.write(f'  задержка: p50 {p50:.1f} мс, p95 {p95:.1f} мс, p99 {p99:.1f} мс')
+        self.stdout.write(
+            '  ответы: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  ошибок: {errors}'))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые ключи идемпотентности заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.IDEMPOTENCY_KEY_TTL_DAYS,
+            help='Удалить ключи старше N дней',
+        )
+
+    def handle(self, *args, **options):
+        deleted, _ = (
+            IdempotencyKey.objects
+            .filter(created_at__lt=timezone.now() - timedelta(days=options['days']))
+            .delete()
+        )
+        self.stdout.write(f'Удалено ключей: {deleted}')
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0049_restaurant_lat_restaurant_lon'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurantmenuitem',
+            index=models.Index(condition=models.Q(('availability', True)), fields=['product', 'availability'], name='menu_item_available_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='delivery_radius_km',
+            field=models.FloatField(blank=True, help_text='Если не указан, используется радиус по умолчанию', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='радиус доставки, км'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0052_restaurant_delivery_radius_km'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='max_active_orders',
+            field=models.PositiveIntegerField(blank=True, help_text='Сколько заказов в сборке и доставке ресторан берёт одновременно. Пусто — без ограничений', null=True, verbose_name='макс. заказов в работе'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusTransition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('raw', 'Необработанный'), ('assembled', 'Cборка'), ('delivery', 'Доставка'), ('ready', 'Готов')], max_length=20, verbose_name='Прежний статус')),
+                ('to_status', models.CharField(choices=[('raw', 'Необработанный'), ('assembled', 'Cборка'), ('delivery', 'Доставка'), ('ready', 'Готов')], max_length=20, verbose_name='Новый статус')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время перехода')),
+            ],
+            options={
+                'verbose_name': 'смена статуса заказа',
+                'verbose_name_plural': 'смены статусов заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'raw')), fields=['registered_at', 'id'], name='order_raw_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'assembled')), fields=['registered_at', 'id'], name='order_assembled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'delivery')), fields=['registered_at', 'id'], name='order_delivery_idx'),
+        ),
+        migrations.AddField(
+            model_name='orderstatustransition',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_transitions', to='foodcartapp.order', verbose_name='Заказ'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatustransition',
+            index=models.Index(fields=['to_status', 'created_at', 'id'], name='order_status_entered_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def create_initial_transitions(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderStatusTransition = apps.get_model('foodcartapp', 'OrderStatusTransition')
+    # Настоящее время создания старых заказов неизвестно, берём время
+    # регистрации: с текущим временем все старые заказы попали бы в журнал
+    # как только что вошедшие в свой статус
+    orders = (
+        Order.objects
+        .filter(status_transitions__isnull=True)
+        .values_list('id', 'status', 'registered_at')
+        .order_by('id')
+        .iterator(chunk_size=2000)
+    )
+    OrderStatusTransition.objects.bulk_create(
+        (
+            OrderStatusTransition(order_id=order_id, to_status=status, created_at=registered_at)
+            for order_id, status, registered_at in orders
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_order_status_transitions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_initial_transitions, migrations.RunPython.noop),
+    ]
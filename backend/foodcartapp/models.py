@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
@@ -20,6 +24,21 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    lat = models.FloatField('широта', null=True, blank=True)
+    lon = models.FloatField('долгота', null=True, blank=True)
+    delivery_radius_km = models.FloatField(
+        'радиус доставки, км',
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        help_text='Если не указан, используется радиус по умолчанию',
+    )
+    max_active_orders = models.PositiveIntegerField(
+        'макс. заказов в работе',
+        null=True,
+        blank=True,
+        help_text='Сколько заказов в сборке и доставке ресторан берёт одновременно. Пусто — без ограничений',
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -28,15 +47,26 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def coordinates(self):
+        if self.lat is None or self.lon is None:
+            return None
+        return (self.lon, self.lat)
+
+    @property
+    def effective_delivery_radius_km(self):
+        if self.delivery_radius_km is None:
+            return settings.DEFAULT_DELIVERY_RADIUS_KM
+        return self.delivery_radius_km
+
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        available_menu_items = RestaurantMenuItem.objects.filter(
+            product=OuterRef('pk'),
+            availability=True,
         )
-        return self.filter(pk__in=products)
+        return self.filter(Exists(available_menu_items))
 
 
 class ProductCategory(models.Model):
@@ -121,16 +151,45 @@ class RestaurantMenuItem(models.Model):
         unique_together = [
             ['restaurant', 'product']
         ]
+        indexes = [
+            models.Index(
+                fields=['product', 'availability'],
+                condition=Q(availability=True),
+                name='menu_item_available_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
 class OrderQuerySet(models.QuerySet):
-    def total_price(self):
+    def with_calculated_total_price(self):
         return self.annotate(
-            total_price=Sum(F('details__quantity') * F('details__price'))
-        ).order_by('id')
+            calculated_total_price=Coalesce(
+                Sum(F('details__quantity') * F('details__price')),
+                Value(0),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+
+    def recalculate_total_price(self):
+        """Пересчитывает сохранённую стоимость заказов по их составу одним запросом."""
+        details_total = (
+            OrderDetails.objects
+            .filter(order=OuterRef('pk'))
+            .values('order')
+            .annotate(total=Sum(F('quantity') * F('price')))
+            .values('total')
+        )
+        return self.update(
+            total_price=Coalesce(
+                Subquery(details_total),
+                Value(0),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
 
 
 
@@ -141,6 +200,12 @@ class Order(models.Model):
         ('delivery', 'Доставка'),
         ('ready', 'Готов'),
     )
+    STATUS_TRANSITIONS = {
+        'raw': ['assembled'],
+        'assembled': ['raw', 'delivery'],
+        'delivery': ['assembled', 'ready'],
+        'ready': [],
+    }
     status = models.CharField(
         'Статус',
         max_length=20,
@@ -181,13 +246,55 @@ class Order(models.Model):
         blank=True,
         null=True
     )
+    updated_at = models.DateTimeField(
+        'Время изменения',
+        auto_now=True,
+        db_index=True,
+    )
     restaurant = models.ForeignKey(Restaurant, verbose_name='Ресторан', null=True, blank=True, on_delete=models.CASCADE)
+    total_price = models.DecimalField(
+        'Стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        editable=False,
+    )
     objects = OrderQuerySet.as_manager()
 
     @property
     def full_name(self):
         return f"{self.firstname} {self.lastname}"
 
+    def can_change_status(self, status):
+        return status in self.STATUS_TRANSITIONS[self.status]
+
+    def change_status(self, status, changed_at=None):
+        """Переводит заказ в новый статус и проставляет время звонка и доставки.
+
+        Заказ не сохраняется. Возвращает несохранённую запись журнала переходов,
+        чтобы вызывающий код мог записать журнал пачкой.
+        """
+        if not self.can_change_status(status):
+            statuses = dict(self.PROCESSING_STATUS_CHOICES)
+            raise ValidationError(
+                {'status': f'Нельзя перевести заказ из статуса «{statuses[self.status]}» в «{statuses[status]}»'},
+                code='invalid_transition',
+            )
+        changed_at = changed_at or timezone.now()
+        transition = OrderStatusTransition(
+            order=self,
+            from_status=self.status,
+            to_status=status,
+            created_at=changed_at,
+        )
+        self.status = status
+        if status != 'raw' and not self.called_at:
+            self.called_at = changed_at
+        if status == 'ready' and not self.delivered_at:
+            self.delivered_at = changed_at
+        return transition
+
     def __str__(self):
         return f'Заказ № {self.id} - {self.firstname} {self.lastname}, {self.address} - {self.status}'
 
@@ -195,6 +302,55 @@ class Order(models.Model):
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['registered_at', 'id'],
+                condition=Q(status=status),
+                name=f'order_{status}_idx',
+            )
+            for status in ['raw', 'assembled', 'delivery']
+        ]
+
+
+class OrderStatusTransitionQuerySet(models.QuerySet):
+    def entered(self, status, since):
+        """Переходы в статус после момента since, в порядке записи в журнал."""
+        return self.filter(to_status=status, created_at__gt=since).order_by('created_at', 'id')
+
+
+class OrderStatusTransition(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        verbose_name='Заказ',
+        related_name='status_transitions',
+    )
+    from_status = models.CharField(
+        'Прежний статус',
+        max_length=20,
+        choices=Order.PROCESSING_STATUS_CHOICES,
+        blank=True,
+    )
+    to_status = models.CharField(
+        'Новый статус',
+        max_length=20,
+        choices=Order.PROCESSING_STATUS_CHOICES,
+    )
+    created_at = models.DateTimeField('Время перехода', default=timezone.now)
+    objects = OrderStatusTransitionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'смена статуса заказа'
+        verbose_name_plural = 'смены статусов заказов'
+        indexes = [
+            models.Index(
+                fields=['to_status', 'created_at', 'id'],
+                name='order_status_entered_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Заказ № {self.order_id}: {self.from_status or "—"} → {self.to_status}'
 
 
 class OrderDetails(models.Model):
@@ -228,3 +384,22 @@ class OrderDetails(models.Model):
     class Meta:
         verbose_name = 'Элементы заказа'
         verbose_name_plural = 'Элементы заказа'
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField('Ключ', max_length=255, unique=True)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        verbose_name='Заказ',
+        related_name='idempotency_keys',
+    )
+    response = models.JSONField('Ответ API', encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('Время создания', default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
@@ -1,25 +1,112 @@
-from rest_framework.serializers import ModelSerializer
-from rest_framework.templatetags.rest_framework import items
+from rest_framework.serializers import (
+    BooleanField,
+    IntegerField,
+    ListSerializer,
+    ModelSerializer,
+    PrimaryKeyRelatedField,
+    Serializer,
+)
 
-from foodcartapp.models import Order, OrderDetails\
+from foodcartapp.models import Order, OrderDetails, OrderStatusTransition, Product
+from foodcartapp.signals import orders_changed
+
+
+class ProductField(PrimaryKeyRelatedField):
+    """Ищет товар среди загруженных заранее в context['products'], если они есть."""
+
+    def to_internal_value(self, data):
+        products = self.context.get('products')
+        if products is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            product = products.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if product is None:
+            self.fail('does_not_exist', pk_value=data)
+        return product
 
 
 class OrderDetailsSerializer(ModelSerializer):
+    product = ProductField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderDetails
         fields = ['product', 'quantity']
 
 
+def get_total_price(products_fields):
+    return sum(
+        fields['product'].price * fields['quantity']
+        for fields in products_fields
+    )
+
+
+def collect_product_ids(orders_data):
+    product_ids = set()
+    for order_data in orders_data:
+        if not isinstance(order_data, dict) or not isinstance(order_data.get('products'), list):
+            continue
+        for product_data in order_data['products']:
+            if not isinstance(product_data, dict):
+                continue
+            try:
+                product_ids.add(int(product_data.get('product')))
+            except (TypeError, ValueError):
+                continue
+    return product_ids
+
+
+class OrderListSerializer(ListSerializer):
+    """Пачка заказов: товары загружаются одним запросом, заказы, их состав
+    и записи журнала статусов сохраняются тремя bulk_create.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context['products'] = Product.objects.in_bulk(collect_product_ids(data))
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        orders = []
+        for fields in validated_data:
+            fields = dict(fields)
+            products_fields = fields.pop('products')
+            orders.append(Order(**fields, total_price=get_total_price(products_fields)))
+        Order.objects.bulk_create(orders)
+
+        OrderDetails.objects.bulk_create(
+            OrderDetails(
+                order=order,
+                product=product_fields['product'],
+                quantity=product_fields['quantity'],
+                price=product_fields['product'].price,
+            )
+            for order, fields in zip(orders, validated_data)
+            for product_fields in fields['products']
+        )
+        OrderStatusTransition.objects.bulk_create(
+            OrderStatusTransition(order=order, to_status=order.status)
+            for order in orders
+        )
+        orders_changed.send(sender=Order, order_ids=[order.id for order in orders])
+        return orders
+
+
 class OrderSerializer(ModelSerializer):
     products = OrderDetailsSerializer(many=True, allow_empty=False, write_only=True)
 
     class Meta:
         model = Order
         fields = ['id', 'products', 'firstname', 'lastname', 'phonenumber', 'address']
+        list_serializer_class = OrderListSerializer
 
 
     def create(self, validated_data):
         products_fields = validated_data.pop('products')
+        validated_data['total_price'] = get_total_price(products_fields)
 
         order = super().create(validated_data)
 
@@ -34,4 +121,12 @@ class OrderSerializer(ModelSerializer):
         ]
 
         OrderDetails.objects.bulk_create(order_details)
+        OrderStatusTransition.objects.create(order=order, to_status=order.status)
         return order
+
+
+class ProductPageSerializer(Serializer):
+    after = IntegerField(min_value=0, required=False)
+    limit = IntegerField(min_value=1, max_value=200, default=50)
+    category = IntegerField(required=False)
+    special_status = BooleanField(required=False, allow_null=True, default=None)
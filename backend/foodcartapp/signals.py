@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from foodcartapp.availability import invalidate_availability_index
+from foodcartapp.catalogue import invalidate_catalogue
+from foodcartapp.models import Product, ProductCategory, RestaurantMenuItem
+
+
+# Заказы изменены в обход save(): bulk_create, bulk_update, update()
+orders_changed = Signal()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_availability_index(sender, **kwargs):
+    # Повторно после коммита: кэш общий для воркеров, и другой процесс мог
+    # успеть собрать индекс из данных до коммита
+    invalidate_availability_index()
+    transaction.on_commit(invalidate_availability_index)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+def reset_catalogue(sender, **kwargs):
+    invalidate_catalogue()
+    transaction.on_commit(invalidate_catalogue)
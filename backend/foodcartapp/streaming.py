@@ -0,0 +1,36 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+def dump_json(data):
+    return json.dumps(
+        data,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+
+
+def iter_json_array(objects, serialize, buffer_size=64 * 1024):
+    """Кодирует объекты в JSON-массив по одному, отдавая куски примерно по buffer_size байт."""
+    buffer = bytearray(b'[')
+    for number, obj in enumerate(objects):
+        if number:
+            buffer += b','
+        buffer += dump_json(serialize(obj))
+        if len(buffer) >= buffer_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']'
+    yield bytes(buffer)
+
+
+def stream_queryset_as_json(queryset, serialize):
+    objects = queryset.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+    return StreamingHttpResponse(
+        iter_json_array(objects, serialize),
+        content_type='application/json',
+    )
@@ -0,0 +1,703 @@
+from datetime import timedelta
+import io
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp import async_views, views
+from foodcartapp.availability import (
+    get_availability_index,
+    get_restaurants_mask,
+    iter_restaurant_ids,
+)
+from foodcartapp.catalogue import get_cached_catalogue, stream_catalogue
+from foodcartapp.models import (
+    Order,
+    OrderDetails,
+    OrderStatusTransition,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from foodcartapp.streaming import iter_json_array
+from locations.backends import get_geocoder_backends
+from locations.cache import geocode_cache
+from locations.models import AddressCache
+from locations.normalization import normalize_address
+
+
+class StubGeocoder:
+    coordinates = {
+        'Москва, Тверская 1': ('37.613', '55.757'),
+        'Москва, Арбат 10': ('37.594', '55.751'),
+    }
+    geocoded_addresses = []
+
+    def geocode(self, geo_apikey, address):
+        self.geocoded_addresses.append(address)
+        return self.coordinates.get(address)
+
+
+@override_settings(GEOCODER_BACKENDS=['foodcartapp.tests.StubGeocoder'])
+class RestaurantGeocodingTest(TestCase):
+    def setUp(self):
+        get_geocoder_backends.cache_clear()
+        self.addCleanup(get_geocoder_backends.cache_clear)
+        geocode_cache.clear()
+        StubGeocoder.geocoded_addresses = []
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    def post_restaurant(self, url, **fields):
+        data = {
+            'name': 'Первый',
+            'address': 'Москва, Тверская 1',
+            'contact_phone': '',
+            'delivery_radius_km': '',
+            'max_active_orders': '',
+            'menu_items-TOTAL_FORMS': 0,
+            'menu_items-INITIAL_FORMS': 0,
+            **fields,
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_admin_geocodes_new_and_changed_address(self):
+        self.post_restaurant(reverse('admin:foodcartapp_restaurant_add'))
+        restaurant = Restaurant.objects.get()
+        self.assertEqual(restaurant.coordinates, (37.613, 55.757))
+
+        # Без кэшей любой вызов геокодера дошёл бы до бэкенда
+        AddressCache.objects.all().delete()
+        geocode_cache.clear()
+        change_url = reverse('admin:foodcartapp_restaurant_change', args=[restaurant.id])
+        self.post_restaurant(change_url, name='Первый на Тверской')
+        self.assertEqual(StubGeocoder.geocoded_addresses, ['Москва, Тверская 1'])
+
+        self.post_restaurant(change_url, address='Москва, Арбат 10')
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.coordinates, (37.594, 55.751))
+        self.assertEqual(StubGeocoder.geocoded_addresses, ['Москва, Тверская 1', 'Москва, Арбат 10'])
+
+    def test_command_geocodes_restaurants_without_coordinates(self):
+        located = Restaurant.objects.create(name='Первый', address='Москва, Тверская 1', lat=1, lon=2)
+        unlocated = Restaurant.objects.create(name='Второй', address='Москва, Арбат 10')
+        Restaurant.objects.create(name='Без адреса')
+
+        call_command('geocode_restaurants', stdout=io.StringIO())
+
+        unlocated.refresh_from_db()
+        self.assertEqual(unlocated.coordinates, (37.594, 55.751))
+        self.assertEqual(StubGeocoder.geocoded_addresses, ['Москва, Арбат 10'])
+
+        call_command('geocode_restaurants', all=True, stdout=io.StringIO())
+        located.refresh_from_db()
+        self.assertEqual(located.coordinates, (37.613, 55.757))
+
+
+class AvailabilityIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+        self.first = Restaurant.objects.create(name='Первый')
+        self.second = Restaurant.objects.create(name='Второй')
+        RestaurantMenuItem.objects.create(restaurant=self.first, product=self.burger)
+        RestaurantMenuItem.objects.create(restaurant=self.first, product=self.fries)
+        RestaurantMenuItem.objects.create(restaurant=self.second, product=self.burger)
+
+    def get_restaurant_ids(self, *products):
+        index = get_availability_index()
+        mask = get_restaurants_mask(index, [product.id for product in products])
+        return set(iter_restaurant_ids(index, mask))
+
+    def test_intersects_restaurants_for_all_products(self):
+        self.assertEqual(
+            self.get_restaurant_ids(self.burger),
+            {self.first.id, self.second.id},
+        )
+        self.assertEqual(self.get_restaurant_ids(self.burger, self.fries), {self.first.id})
+        self.assertEqual(self.get_restaurant_ids(), set())
+
+    def test_menu_changes_invalidate_index(self):
+        self.assertEqual(self.get_restaurant_ids(self.fries), {self.first.id})
+
+        RestaurantMenuItem.objects.create(restaurant=self.second, product=self.fries)
+        self.assertEqual(self.get_restaurant_ids(self.fries), {self.first.id, self.second.id})
+
+        RestaurantMenuItem.objects.filter(restaurant=self.first).delete()
+        self.assertEqual(self.get_restaurant_ids(self.fries), {self.second.id})
+
+    def test_mask_width_does_not_depend_on_restaurant_ids(self):
+        distant = Restaurant.objects.create(id=10 ** 6, name='Дальний')
+        RestaurantMenuItem.objects.create(restaurant=distant, product=self.fries)
+
+        index = get_availability_index()
+
+        self.assertEqual(max(mask.bit_length() for mask in index['masks'].values()), 3)
+        self.assertEqual(self.get_restaurant_ids(self.fries), {self.first.id, distant.id})
+
+
+class JsonArrayStreamTest(SimpleTestCase):
+    def test_chunks_form_valid_json(self):
+        objects = [{'id': number, 'comment': 'ж' * 100} for number in range(100)]
+
+        chunks = list(iter_json_array(objects, dict, buffer_size=1000))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) >= 1000 for chunk in chunks[:-1]))
+        self.assertEqual(json.loads(b''.join(chunks)), objects)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array([], dict)), [b'[]'])
+
+
+class CatalogueCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        restaurant = Restaurant.objects.create(name='Первый')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+
+    def get_catalogue(self, **headers):
+        return self.client.get('/api/products/', headers=headers)
+
+    def test_miss_then_cached_etag_then_not_modified(self):
+        response = self.get_catalogue()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        body = response.getvalue()
+        self.assertEqual([product['id'] for product in json.loads(body)], [self.burger.id])
+
+        with self.assertNumQueries(0):
+            cached_response = self.get_catalogue()
+        self.assertEqual(cached_response.content, body)
+        etag = cached_response['ETag']
+
+        response = self.get_catalogue(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates_catalogue(self):
+        self.get_catalogue().getvalue()
+        etag = self.get_catalogue()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.burger.price = 150
+            self.burger.save()
+
+        response = self.get_catalogue(If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.getvalue())[0]['price'], '150.00')
+        self.assertNotEqual(self.get_catalogue()['ETag'], etag)
+
+    def test_change_during_streaming_is_not_cached(self):
+        chunks = stream_catalogue()
+        first_chunk = next(chunks)
+
+        self.burger.price = 150
+        self.burger.save()
+        list(chunks)
+
+        self.assertEqual(json.loads(first_chunk)[0]['price'], '100.00')
+        self.assertIsNone(get_cached_catalogue())
+        self.assertEqual(json.loads(self.get_catalogue().getvalue())[0]['price'], '150.00')
+
+
+class ProductPageTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.burgers = ProductCategory.objects.create(name='Бургеры')
+        self.drinks = ProductCategory.objects.create(name='Напитки')
+        restaurant = Restaurant.objects.create(name='Первый')
+        self.products = [
+            Product.objects.create(
+                name=f'Товар {number}',
+                price=100,
+                image='burger.jpg',
+                category=self.drinks if number % 2 else self.burgers,
+                special_status=number < 2,
+            )
+            for number in range(5)
+        ]
+        for product in self.products:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=product)
+        unavailable = Product.objects.create(name='Нет в продаже', price=100, image='burger.jpg')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=unavailable, availability=False)
+
+    def get_page(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_through_catalogue_by_cursor(self):
+        product_ids = []
+        pages_count = 0
+        params = {'limit': 2}
+        while True:
+            page = self.get_page(**params)
+            pages_count += 1
+            product_ids += [product['id'] for product in page['results']]
+            if page['next_cursor'] is None:
+                break
+            params['after'] = page['next_cursor']
+
+        self.assertEqual(pages_count, 3)
+        self.assertEqual(product_ids, [product.id for product in self.products])
+
+    def test_filters_by_category_and_special_status(self):
+        drinks = self.get_page(category=self.drinks.id)['results']
+        self.assertEqual([product['id'] for product in drinks], [self.products[1].id, self.products[3].id])
+
+        specials = self.get_page(special_status='true')['results']
+        self.assertEqual([product['id'] for product in specials], [self.products[0].id, self.products[1].id])
+
+        special_burgers = self.get_page(category=self.burgers.id, special_status='true')['results']
+        self.assertEqual([product['id'] for product in special_burgers], [self.products[0].id])
+
+    def test_rejects_invalid_parameters(self):
+        for params, field in [({'limit': 0}, 'limit'), ({'limit': 201}, 'limit'), ({'after': -1}, 'after')]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/products/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json())
+
+    def test_plain_list_is_unchanged(self):
+        response = self.client.get('/api/products/')
+
+        catalogue = {product['id']: product for product in json.loads(response.getvalue())}
+        self.assertEqual(set(catalogue), {product.id for product in self.products})
+        first_product = catalogue[self.products[0].id]
+        self.assertEqual(
+            set(first_product),
+            {'id', 'name', 'price', 'special_status', 'description', 'category', 'image', 'restaurant'},
+        )
+        self.assertEqual(first_product['category'], {'id': self.burgers.id, 'name': 'Бургеры'})
+
+
+class OrderTotalPriceTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+
+    def test_api_stores_total_price(self):
+        response = self.client.post('/api/order/', {
+            'products': [
+                {'product': self.burger.id, 'quantity': 2},
+                {'product': self.fries.id, 'quantity': 1},
+            ],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().total_price, 250)
+
+    def test_check_command_fixes_mismatched_orders(self):
+        order = Order.objects.create(
+            address='Москва, Тверская 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+        )
+        OrderDetails.objects.create(order=order, product=self.burger, quantity=3, price=100)
+
+        with self.assertRaises(CommandError):
+            call_command('check_order_totals', stdout=io.StringIO())
+        call_command('check_order_totals', fix=True, stdout=io.StringIO())
+
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, 300)
+        call_command('check_order_totals', stdout=io.StringIO())
+
+
+class OrderGeocodingTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+
+    def post_order(self, products):
+        return self.client.post('/api/order/', {
+            'products': products,
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+        }, content_type='application/json')
+
+    def test_geocodes_address_after_commit(self):
+        with mock.patch('foodcartapp.views.geocode_in_background') as geocode_in_background:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.post_order([{'product': self.burger.id, 'quantity': 1}])
+            self.assertEqual(response.status_code, 200)
+            geocode_in_background.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        geocode_in_background.assert_called_once_with('Москва, Тверская 1')
+
+    def test_failed_order_is_not_geocoded(self):
+        with mock.patch('foodcartapp.views.geocode_in_background') as geocode_in_background:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.post_order([{'product': 999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(callbacks, [])
+        geocode_in_background.assert_not_called()
+
+
+class OrdersBatchTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+
+    def make_order(self, products, **fields):
+        return {
+            'products': products,
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+            **fields,
+        }
+
+    def test_creates_orders_with_constant_number_of_queries(self):
+        orders = [
+            self.make_order([
+                {'product': self.burger.id, 'quantity': 2},
+                {'product': self.fries.id, 'quantity': 1},
+            ])
+            for _ in range(20)
+        ]
+
+        with self.assertNumQueries(6):
+            response = self.client.post('/api/orders/batch/', orders, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 20)
+        self.assertEqual(Order.objects.filter(total_price=250).count(), 20)
+        self.assertEqual(OrderDetails.objects.count(), 40)
+
+    def test_reports_errors_per_order_and_saves_nothing(self):
+        orders = [
+            self.make_order([{'product': self.burger.id, 'quantity': 1}]),
+            self.make_order([{'product': 999, 'quantity': 1}]),
+            self.make_order([], firstname=''),
+        ]
+
+        response = self.client.post('/api/orders/batch/', orders, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('products', errors[1])
+        self.assertEqual(set(errors[2]), {'products', 'firstname'})
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotentOrderTest(TestCase):
+    def setUp(self):
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.order = {
+            'products': [{'product': self.burger.id, 'quantity': 1}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+        }
+
+    def post_order(self, idempotency_key):
+        return self.client.post(
+            '/api/order/',
+            self.order,
+            content_type='application/json',
+            headers={'Idempotency-Key': idempotency_key},
+        )
+
+    def test_replay_returns_original_response_without_new_order(self):
+        first_response = self.post_order('retry-1')
+
+        # Только поиск ключа, обёрнутый в точку сохранения транзакции
+        with self.assertNumQueries(3):
+            replayed_response = self.post_order('retry-1')
+
+        self.assertEqual(replayed_response.status_code, 200)
+        self.assertEqual(replayed_response.json(), first_response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+        self.post_order('retry-2')
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class OrderAdminSaveTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(self.admin)
+        ContentType.objects.get_for_model(Order)
+
+    def create_order(self, lines_count):
+        products = Product.objects.bulk_create(
+            Product(name=f'Товар {number}', price=100 + number, image='burger.jpg')
+            for number in range(lines_count)
+        )
+        order = Order.objects.create(
+            address='Москва, Тверская 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+        )
+        details = OrderDetails.objects.bulk_create(
+            OrderDetails(order=order, product=product, quantity=1, price=1)
+            for product in products
+        )
+        return order, details
+
+    def post_change(self, order, details):
+        data = {
+            'address': order.address,
+            'status': order.status,
+            'payment_method': order.payment_method,
+            'firstname': order.firstname,
+            'lastname': order.lastname,
+            'phonenumber': str(order.phonenumber),
+            'comment': '',
+            'restaurant': '',
+            'registered_at_0': order.registered_at.strftime('%Y-%m-%d'),
+            'registered_at_1': order.registered_at.strftime('%H:%M:%S'),
+            'details-TOTAL_FORMS': len(details) + 1,
+            'details-INITIAL_FORMS': len(details),
+            'details-MIN_NUM_FORMS': 0,
+            'details-MAX_NUM_FORMS': 1000,
+            'status_transitions-TOTAL_FORMS': 0,
+            'status_transitions-INITIAL_FORMS': 0,
+        }
+        for number, detail in enumerate(details):
+            data.update({
+                f'details-{number}-id': detail.id,
+                f'details-{number}-order': order.id,
+                f'details-{number}-product': detail.product_id,
+                f'details-{number}-quantity': 2,
+                f'details-{number}-price': detail.price,
+            })
+        data[f'details-{len(details) - 1}-DELETE'] = 'on'
+        data.update({
+            f'details-{len(details)}-order': order.id,
+            f'details-{len(details)}-product': details[0].product_id,
+            f'details-{len(details)}-quantity': 1,
+            f'details-{len(details)}-price': 0,
+        })
+        return self.client.post(reverse('admin:foodcartapp_order_change', args=[order.id]), data)
+
+    def test_number_of_queries_does_not_depend_on_lines_count(self):
+        queries_counts = []
+        for lines_count in [3, 30]:
+            order, details = self.create_order(lines_count)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_change(order, details)
+            self.assertEqual(response.status_code, 302)
+            queries_counts.append(len(queries))
+
+            order.refresh_from_db()
+            kept_details = details[:-1]
+            self.assertEqual(order.details.count(), lines_count)
+            self.assertEqual(
+                order.total_price,
+                sum(2 * detail.product.price for detail in kept_details) + details[0].product.price,
+            )
+
+        self.assertEqual(queries_counts[0], queries_counts[1])
+
+    def test_creation_transition_uses_current_time(self):
+        registered_at = timezone.now() - timedelta(days=3)
+        started_at = timezone.now()
+        response = self.client.post(reverse('admin:foodcartapp_order_add'), {
+            'address': 'Москва, Тверская 1',
+            'status': 'raw',
+            'payment_method': 'cash',
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'comment': '',
+            'restaurant': '',
+            'registered_at_0': registered_at.strftime('%Y-%m-%d'),
+            'registered_at_1': registered_at.strftime('%H:%M:%S'),
+            'details-TOTAL_FORMS': 0,
+            'details-INITIAL_FORMS': 0,
+            'status_transitions-TOTAL_FORMS': 0,
+            'status_transitions-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+
+        transition = OrderStatusTransition.objects.get()
+        self.assertEqual(transition.to_status, 'raw')
+        self.assertGreaterEqual(transition.created_at, started_at)
+
+    def test_changes_product_of_line(self):
+        order, details = self.create_order(3)
+        response = self.client.get(reverse('admin:foodcartapp_order_change', args=[order.id]))
+        self.assertContains(response, f'<option value="{details[0].product_id}" selected>')
+
+        details[0].product = details[1].product
+        self.assertEqual(self.post_change(order, details).status_code, 302)
+
+        self.assertEqual(OrderDetails.objects.get(id=details[0].id).product, details[1].product)
+
+
+class OrderStatusTransitionTest(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            address='Москва, Тверская 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+        )
+
+    def test_sets_timestamps_and_logs_transitions(self):
+        started_at = timezone.now()
+        for status in ['assembled', 'delivery', 'ready']:
+            self.order.change_status(status).save()
+        self.order.save()
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'ready')
+        self.assertIsNotNone(self.order.called_at)
+        self.assertIsNotNone(self.order.delivered_at)
+        self.assertEqual(
+            list(OrderStatusTransition.objects.entered('delivery', started_at).values_list('order', flat=True)),
+            [self.order.id],
+        )
+
+    def test_rejects_disallowed_transition(self):
+        with self.assertRaises(ValidationError):
+            self.order.change_status('ready')
+        self.assertEqual(self.order.status, 'raw')
+
+
+class BackfillStatusTransitionsMigrationTest(TransactionTestCase):
+    migrate_from = [('foodcartapp', '0056_order_status_transitions')]
+    migrate_to = [('foodcartapp', '0057_backfill_order_status_transitions')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.addCleanup(self.migrate_to_latest)
+        self.old_apps = executor.loader.project_state(self.migrate_from).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps
+
+    def test_creates_one_transition_per_order_without_journal(self):
+        OldOrder = self.old_apps.get_model('foodcartapp', 'Order')
+        OldOrderStatusTransition = self.old_apps.get_model('foodcartapp', 'OrderStatusTransition')
+        order_fields = {
+            'address': 'Москва, Тверская 1',
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+        }
+        old_order = OldOrder.objects.create(status='delivery', **order_fields)
+        logged_order = OldOrder.objects.create(status='assembled', **order_fields)
+        OldOrderStatusTransition.objects.create(order=logged_order, from_status='raw', to_status='assembled')
+
+        NewOrderStatusTransition = self.migrate().get_model('foodcartapp', 'OrderStatusTransition')
+
+        self.assertEqual(
+            list(NewOrderStatusTransition.objects.order_by('order').values_list('order', 'from_status', 'to_status')),
+            [(old_order.id, '', 'delivery'), (logged_order.id, 'raw', 'assembled')],
+        )
+        self.assertEqual(
+            NewOrderStatusTransition.objects.get(order=old_order.id).created_at,
+            old_order.registered_at,
+        )
+
+
+@override_settings(GEOCODE_IN_BACKGROUND=False)
+class AsyncApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        restaurant = Restaurant.objects.create(name='Первый', address='Москва, Тверская 1')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+        AddressCache.objects.create(address=normalize_address('Москва, Тверская 1'), lat=55.757, lon=37.613)
+
+    async def test_register_order_is_idempotent(self):
+        order = {
+            'products': [{'product': self.burger.id, 'quantity': 2}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+        }
+        responses = []
+        for _ in range(2):
+            request = self.factory.post(
+                '/api/order/',
+                order,
+                content_type='application/json',
+                headers={'Idempotency-Key': 'async-1'},
+            )
+            responses.append(await async_views.register_order(request))
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(json.loads(responses[0].content), json.loads(responses[1].content))
+        self.assertEqual(await Order.objects.acount(), 1)
+        self.assertEqual((await Order.objects.aget()).total_price, 200)
+
+    async def test_register_order_reports_unknown_product(self):
+        request = self.factory.post('/api/order/', {
+            'products': [{'product': 999, 'quantity': 1}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79001234567',
+            'address': 'Москва, Тверская 1',
+        }, content_type='application/json')
+
+        response = await async_views.register_order(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('products', json.loads(response.content))
+
+    async def test_register_order_body_errors_match_sync_view(self):
+        def post_to_sync_view(body, content_type):
+            response = views.register_order(RequestFactory().post('/api/order/', body, content_type=content_type))
+            return response.render()
+
+        for body, content_type in [('{"products": [', 'application/json'), ('заказ', 'text/plain')]:
+            with self.subTest(content_type=content_type):
+                request = self.factory.post('/api/order/', body, content_type=content_type)
+                response = await async_views.register_order(request)
+                sync_response = await sync_to_async(post_to_sync_view)(body, content_type)
+
+                self.assertIn(response.status_code, [400, 415])
+                self.assertEqual(response.status_code, sync_response.status_code)
+                self.assertEqual(json.loads(response.content), json.loads(sync_response.content))
+
+    async def test_catalogue_is_cached_with_etag(self):
+        response = await async_views.product_list_api(self.factory.get('/api/products/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['id'] for product in json.loads(response.content)], [self.burger.id])
+
+        request = self.factory.get('/api/products/', headers={'If-None-Match': response['ETag']})
+        response = await async_views.product_list_api(request)
+        self.assertEqual(response.status_code, 304)
+
+        page = await async_views.product_list_api(self.factory.get('/api/products/', {'limit': 1}))
+        self.assertEqual(json.loads(page.content)['results'][0]['id'], self.burger.id)
@@ -1,21 +1,28 @@
+from functools import partial
 import logging
 
-from django.db import transaction
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.templatetags.static import static
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from .models import Product, Order, OrderDetails
-from foodcartapp.serializers import OrderSerializer
+from foodcartapp.catalogue import get_cached_catalogue, get_catalogue_page, stream_catalogue
+from foodcartapp.models import IdempotencyKey
+from foodcartapp.serializers import OrderSerializer, ProductPageSerializer
+from foodcartapp.streaming import dump_json
+from locations.geocoder import geocode_in_background
 
 
 logger = logging.getLogger(__name__)
 
 
-def banners_list_api(request):
+def get_banners():
     # FIXME move data to db?
-    return JsonResponse([
+    return [
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -31,46 +38,129 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
+    ]
+
+
+def banners_list_api(request):
+    return JsonResponse(get_banners(), safe=False, json_dumps_params={
         'ensure_ascii': False,
         'indent': 4,
     })
 
 
+def get_request_catalogue(request):
+    if not hasattr(request, 'catalogue'):
+        request.catalogue = get_cached_catalogue()
+    return request.catalogue
+
+
+def get_catalogue_etag(request):
+    catalogue = get_request_catalogue(request)
+    return catalogue['etag'] if catalogue else None
+
+
+def get_catalogue_last_modified(request):
+    catalogue = get_request_catalogue(request)
+    return catalogue['last_modified'] if catalogue else None
+
+
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    if request.GET.keys() & ProductPageSerializer().fields.keys():
+        return product_page_api(request)
+    return product_catalogue_api(request)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=get_catalogue_etag, last_modified_func=get_catalogue_last_modified)
+def product_catalogue_api(request):
+    catalogue = get_request_catalogue(request)
+    if catalogue:
+        return HttpResponse(catalogue['body'], content_type='application/json')
+    return StreamingHttpResponse(stream_catalogue(), content_type='application/json')
+
+
+def product_page_api(request):
+    serializer = ProductPageSerializer(data=request.GET)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400, json_dumps_params={
+            'ensure_ascii': False,
+        })
+    return HttpResponse(
+        dump_json(get_catalogue_page(**serializer.validated_data)),
+        content_type='application/json',
+    )
 
 
 @transaction.atomic
 @api_view(['POST'])
 def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        if not is_valid_idempotency_key(idempotency_key):
+            return Response(IDEMPOTENCY_KEY_ERRORS, status=400)
+        stored_response = get_stored_response(idempotency_key)
+        if stored_response is not None:
+            return Response(stored_response)
+
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
 
-    serializer.save()
+    order, response_data = save_order(serializer, idempotency_key)
+    if order:
+        transaction.on_commit(partial(geocode_in_background, order.address))
+
+    return Response(response_data)
+
+
+IDEMPOTENCY_KEY_ERRORS = {'Idempotency-Key': ['Слишком длинный ключ']}
+
+
+def is_valid_idempotency_key(idempotency_key):
+    return len(idempotency_key) <= IdempotencyKey._meta.get_field('key').max_length
+
+
+def get_stored_response(idempotency_key):
+    return (
+        IdempotencyKey.objects
+        .filter(key=idempotency_key)
+        .values_list('response', flat=True)
+        .first()
+    )
+
+
+def save_order(serializer, idempotency_key=None):
+    """Сохраняет заказ из провалидированного сериализатора вместе с ключом идемпотентности.
+
+    Возвращает заказ и данные ответа. Если параллельный повтор с тем же ключом
+    сохранил заказ первым, этот заказ откатывается: возвращаются None и ответ повтора.
+    """
+    with transaction.atomic():
+        order = serializer.save()
+        if not idempotency_key:
+            return order, serializer.data
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=idempotency_key, order=order, response=serializer.data)
+        except IntegrityError:
+            stored_response = get_stored_response(idempotency_key)
+            transaction.set_rollback(True)
+            return None, stored_response
+        return order, serializer.data
+
+
+@transaction.atomic
+@api_view(['POST'])
+def register_orders_batch(request):
+    serializer = OrderSerializer(
+        data=request.data,
+        many=True,
+        allow_empty=False,
+        max_length=settings.ORDERS_BATCH_MAX_SIZE,
+    )
+    serializer.is_valid(raise_exception=True)
+
+    orders = serializer.save()
+    addresses = {order.address for order in orders}
+    transaction.on_commit(partial(geocode_in_background, *addresses))
 
     return Response(serializer.data)
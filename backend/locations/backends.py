@@ -0,0 +1,198 @@
+from functools import lru_cache
+import asyncio
+import csv
+import weakref
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from locations.circuit_breaker import CircuitBreaker, CircuitOpen, ConcurrencyLimiter, TooManyRequests
+from locations.normalization import normalize_address
+
+
+class GeocodingError(Exception):
+    pass
+
+
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_maxsize=settings.GEOCODER_MAX_WORKERS))
+session.mount('http://', HTTPAdapter(pool_maxsize=settings.GEOCODER_MAX_WORKERS))
+
+geocoder_circuit = CircuitBreaker(
+    'geocoder',
+    failure_threshold=settings.GEOCODER_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.GEOCODER_CIRCUIT_RECOVERY_TIMEOUT,
+)
+geocoder_concurrency = ConcurrencyLimiter(
+    'geocoder',
+    limit=settings.GEOCODER_MAX_IN_FLIGHT,
+    lease_timeout=settings.GEOCODER_TIMEOUT * 2,
+)
+
+
+# У каждого цикла событий свой асинхронный клиент: пул соединений httpx привязан к циклу
+async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    if loop not in async_clients:
+        async_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=settings.GEOCODER_MAX_IN_FLIGHT),
+            timeout=settings.GEOCODER_TIMEOUT,
+        )
+    return async_clients[loop]
+
+
+class YandexGeocoder:
+    def geocode(self, geo_apikey, address):
+        return get_coordinates_from_api(geo_apikey, address)
+
+    async def ageocode(self, geo_apikey, address):
+        return await aget_coordinates_from_api(geo_apikey, address)
+
+
+class GazetteerGeocoder:
+    """Офлайн-геокодер по справочнику адресов зоны доставки.
+
+    Справочник — CSV с колонками address, lon, lat, в нём должны быть полные
+    адреса вплоть до дома. Ищется самый длинный адрес из справочника, которым
+    начинается запрошенный: «Тверская 1, кв. 5» найдётся по записи «Тверская 1».
+    """
+
+    def __init__(self, path=None):
+        self.path = path or settings.GEOCODER_GAZETTEER_PATH
+        self.coordinates = None
+
+    def load(self):
+        coordinates = {}
+        try:
+            with open(self.path, encoding='utf-8', newline='') as gazetteer:
+                for row in csv.DictReader(gazetteer):
+                    coordinates[normalize_address(row['address'])] = (row['lon'], row['lat'])
+        except (OSError, KeyError) as e:
+            raise GeocodingError(f'Не удалось прочитать справочник адресов {self.path}: {e}') from e
+        self.coordinates = coordinates
+
+    def geocode(self, geo_apikey, address):
+        if self.coordinates is None:
+            self.load()
+
+        words = normalize_address(address).split(' ')
+        for length in range(len(words), 0, -1):
+            coordinates = self.coordinates.get(' '.join(words[:length]))
+            if coordinates:
+                return coordinates
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_geocoder_backends():
+    return [import_string(path)() for path in settings.GEOCODER_BACKENDS]
+
+
+def get_coordinates(geo_apikey, address):
+    """Опрашивает геокодеры по порядку, пока один из них не найдёт адрес.
+
+    Если адрес не нашёлся, а какой-то из геокодеров при этом сбоил,
+    пробрасывает его ошибку: результат нельзя считать окончательным.
+    """
+    error = None
+    for backend in get_geocoder_backends():
+        try:
+            coordinates = backend.geocode(geo_apikey, address)
+        except GeocodingError as e:
+            error = e
+            continue
+        if coordinates:
+            return coordinates
+    if error:
+        raise error
+    return None
+
+
+async def aget_coordinates(geo_apikey, address):
+    """Как get_coordinates, но сетевые геокодеры опрашиваются без блокировки цикла событий."""
+    error = None
+    for backend in get_geocoder_backends():
+        try:
+            if hasattr(backend, 'ageocode'):
+                coordinates = await backend.ageocode(geo_apikey, address)
+            else:
+                coordinates = backend.geocode(geo_apikey, address)
+        except GeocodingError as e:
+            error = e
+            continue
+        if coordinates:
+            return coordinates
+    if error:
+        raise error
+    return None
+
+
+def get_most_relevant_position(geocoder_response):
+    found_places = geocoder_response['response']['GeoObjectCollection']['featureMember']
+    return found_places[0]['GeoObject']['Point']['pos'] if found_places else None
+
+
+def get_coordinates_from_api(geo_apikey, address):
+    try:
+        geocoder_circuit.before_call()
+    except CircuitOpen:
+        raise GeocodingError(f'Геокодер временно отключён, адрес «{address}» не проверен')
+
+    try:
+        with geocoder_concurrency.acquire():
+            response = session.get(settings.YANDEX_GEOCODER_URL, params={
+                "geocode": address,
+                "apikey": geo_apikey,
+                "format": "json",
+                },
+                timeout=settings.GEOCODER_TIMEOUT,
+            )
+        response.raise_for_status()
+        most_relevant_position = get_most_relevant_position(response.json())
+    except TooManyRequests:
+        raise GeocodingError(f'Слишком много запросов к геокодеру, адрес «{address}» не проверен')
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        geocoder_circuit.record_failure()
+        raise GeocodingError(f'Геокодер не ответил на запрос «{address}»: {e}') from e
+
+    geocoder_circuit.record_success()
+    if not most_relevant_position:
+        return None
+
+    lon, lat = most_relevant_position.split(" ")
+    return lon, lat
+
+
+async def aget_coordinates_from_api(geo_apikey, address):
+    try:
+        await geocoder_circuit.abefore_call()
+    except CircuitOpen:
+        raise GeocodingError(f'Геокодер временно отключён, адрес «{address}» не проверен')
+
+    try:
+        async with geocoder_concurrency.aacquire():
+            response = await get_async_client().get(settings.YANDEX_GEOCODER_URL, params={
+                "geocode": address,
+                "apikey": geo_apikey,
+                "format": "json",
+            })
+        response.raise_for_status()
+        most_relevant_position = get_most_relevant_position(response.json())
+    except TooManyRequests:
+        raise GeocodingError(f'Слишком много запросов к геокодеру, адрес «{address}» не проверен')
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        await geocoder_circuit.arecord_failure()
+        raise GeocodingError(f'Геокодер не ответил на запрос «{address}»: {e}') from e
+
+    await geocoder_circuit.arecord_success()
+    if not most_relevant_position:
+        return None
+
+    lon, lat = most_relevant_position.split(" ")
+    return lon, lat
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+NOT_FOUND = 'not_found'
+
+
+class GeocodeCache:
+    """Кэш координат в памяти процесса с LRU-вытеснением и временем жизни записей.
+
+    Вторым уровнем может выступать общий для всех воркеров кэш Django.
+    Адреса без координат тоже кэшируются, но на меньший срок.
+    """
+
+    def __init__(self, maxsize, ttl, negative_ttl, shared_cache_alias=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.shared_cache_alias = shared_cache_alias
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @property
+    def shared_cache(self):
+        if not self.shared_cache_alias:
+            return None
+        return caches[self.shared_cache_alias]
+
+    def get_many(self, addresses):
+        """Возвращает {адрес: координаты или None} для найденных в кэше адресов."""
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for address in addresses:
+                entry = self.entries.get(address)
+                if entry is None:
+                    continue
+                coordinates, expires_at = entry
+                if expires_at < now:
+                    del self.entries[address]
+                    continue
+                self.entries.move_to_end(address)
+                found[address] = coordinates
+            self.counters['local_hits'] += len(found)
+
+        missing = [address for address in addresses if address not in found]
+        if missing and self.shared_cache:
+            keys = {self.make_key(address): address for address in missing}
+            shared_found = {
+                keys[key]: None if value == NOT_FOUND else tuple(value)
+                for key, value in self.shared_cache.get_many(keys).items()
+            }
+            self.set_local(shared_found)
+            found.update(shared_found)
+            with self.lock:
+                self.counters['shared_hits'] += len(shared_found)
+
+        with self.lock:
+            self.counters['misses'] += len(addresses) - len(found)
+        return found
+
+    def set_many(self, coordinates):
+        self.set_local(coordinates)
+        if not self.shared_cache:
+            return
+        found = {
+            self.make_key(address): point
+            for address, point in coordinates.items() if point
+        }
+        not_found = {
+            self.make_key(address): NOT_FOUND
+            for address, point in coordinates.items() if not point
+        }
+        self.shared_cache.set_many(found, self.ttl)
+        self.shared_cache.set_many(not_found, self.negative_ttl)
+
+    def set_local(self, coordinates):
+        now = time.monotonic()
+        with self.lock:
+            for address, point in coordinates.items():
+                ttl = self.ttl if point else self.negative_ttl
+                self.entries[address] = (point, now + ttl)
+                self.entries.move_to_end(address)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, addresses):
+        with self.lock:
+            for address in addresses:
+                self.entries.pop(address, None)
+        if self.shared_cache:
+            self.shared_cache.delete_many([self.make_key(address) for address in addresses])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for counter in self.counters:
+                self.counters[counter] = 0
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, 'size': len(self.entries)}
+
+    @staticmethod
+    def make_key(address):
+        return 'geocode:' + hashlib.md5(address.encode()).hexdigest()
+
+
+geocode_cache = GeocodeCache(
+    maxsize=settings.GEOCODER_CACHE_SIZE,
+    ttl=settings.GEOCODER_CACHE_TTL,
+    negative_ttl=settings.GEOCODER_NEGATIVE_CACHE_TTL,
+    shared_cache_alias=settings.GEOCODER_SHARED_CACHE,
+)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            'Кэш по умолчанию хранится в памяти процесса.',
+            hint=(
+                'Размыкатель и ограничитель запросов к геокодеру, каталог товаров '
+                'и индекс доступности работают отдельно в каждом воркере. '
+                'Задайте CACHE_URL общего кэша, например redis://redis:6379/1.'
+            ),
+            id='locations.W001',
+        ),
+    ]
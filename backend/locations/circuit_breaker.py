@@ -0,0 +1,125 @@
+from contextlib import asynccontextmanager, contextmanager
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class TooManyRequests(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Размыкатель для внешнего сервиса, общий для всех воркеров через кэш Django.
+
+    После failure_threshold сбоев подряд размыкается на recovery_timeout секунд.
+    Затем пропускает один пробный вызов: при успехе замыкается, при сбое
+    снова размыкается.
+    """
+
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures_key = f'circuit:{name}:failures'
+        self.opened_until_key = f'circuit:{name}:opened_until'
+        self.trial_key = f'circuit:{name}:trial'
+
+    def before_call(self):
+        opened_until = cache.get(self.opened_until_key)
+        if opened_until is None:
+            return
+        if time.time() < opened_until:
+            raise CircuitOpen
+        if not cache.add(self.trial_key, True, self.recovery_timeout):
+            raise CircuitOpen
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_until_key, self.trial_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, None)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            failures = 1
+        if failures >= self.failure_threshold or cache.get(self.opened_until_key):
+            cache.set(self.opened_until_key, time.time() + self.recovery_timeout, None)
+            cache.delete(self.trial_key)
+
+    def reset(self):
+        self.record_success()
+
+    # Асинхронные варианты для асинхронного кода: синхронные вызовы кэша
+    # блокировали бы цикл событий
+
+    async def abefore_call(self):
+        opened_until = await cache.aget(self.opened_until_key)
+        if opened_until is None:
+            return
+        if time.time() < opened_until:
+            raise CircuitOpen
+        if not await cache.aadd(self.trial_key, True, self.recovery_timeout):
+            raise CircuitOpen
+
+    async def arecord_success(self):
+        await cache.adelete_many([self.failures_key, self.opened_until_key, self.trial_key])
+
+    async def arecord_failure(self):
+        await cache.aadd(self.failures_key, 0, None)
+        try:
+            failures = await cache.aincr(self.failures_key)
+        except ValueError:
+            failures = 1
+        if failures >= self.failure_threshold or await cache.aget(self.opened_until_key):
+            await cache.aset(self.opened_until_key, time.time() + self.recovery_timeout, None)
+            await cache.adelete(self.trial_key)
+
+
+class ConcurrencyLimiter:
+    """Ограничивает число одновременных вызовов во всех воркерах.
+
+    Каждый вызов арендует один из limit слотов — отдельный ключ в кэше со
+    своим сроком аренды lease_timeout. Слот освобождается по окончании вызова,
+    а если воркер упал — по истечении аренды. Ограничение общее для воркеров,
+    только если общий кэш Django.
+    """
+
+    def __init__(self, name, limit, lease_timeout):
+        self.limit = limit
+        self.lease_timeout = lease_timeout
+        self.slot_keys = [f'concurrency:{name}:{slot}' for slot in range(limit)]
+
+    @contextmanager
+    def acquire(self):
+        lease = uuid.uuid4().hex
+        # Слоты перебираются в случайном порядке, чтобы воркеры не толпились у первых
+        for slot_key in random.sample(self.slot_keys, len(self.slot_keys)):
+            if cache.add(slot_key, lease, self.lease_timeout):
+                break
+        else:
+            raise TooManyRequests
+        try:
+            yield
+        finally:
+            # Аренда могла истечь, и слот уже занят другим вызовом
+            if cache.get(slot_key) == lease:
+                cache.delete(slot_key)
+
+    @asynccontextmanager
+    async def aacquire(self):
+        lease = uuid.uuid4().hex
+        for slot_key in random.sample(self.slot_keys, len(self.slot_keys)):
+            if await cache.aadd(slot_key, lease, self.lease_timeout):
+                break
+        else:
+            raise TooManyRequests
+        try:
+            yield
+        finally:
+            if await cache.aget(slot_key) == lease:
+                await cache.adelete(slot_key)
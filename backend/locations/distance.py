@@ -0,0 +1,65 @@
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_radians_array(coordinates):
+    """Переводит список пар (lon, lat) в массив радиан, None превращается в NaN."""
+    array = np.full((len(coordinates), 2), np.nan)
+    for index, point in enumerate(coordinates):
+        if point:
+            array[index] = point
+    return np.radians(array)
+
+
+def haversine(origins, destinations):
+    """Расстояния в километрах между массивами точек в радианах (lon, lat) с broadcasting."""
+    origin_lon, origin_lat = origins[..., 0], origins[..., 1]
+    destination_lon, destination_lat = destinations[..., 0], destinations[..., 1]
+
+    half_chord = (
+        np.sin((destination_lat - origin_lat) / 2) ** 2
+        + np.cos(origin_lat) * np.cos(destination_lat)
+        * np.sin((destination_lon - origin_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(half_chord, 0, 1)))
+
+
+def haversine_matrix(origins, destinations):
+    """Попарные расстояния в километрах между точками (lon, lat).
+
+    Строки матрицы соответствуют origins, столбцы — destinations.
+    Если у точки нет координат, расстояния до неё равны NaN.
+    """
+    origins = to_radians_array(origins)
+    destinations = to_radians_array(destinations)
+    return haversine(origins[:, np.newaxis, :], destinations[np.newaxis, :, :])
+
+
+def haversine_sparse_matrix(origins, destinations, pairs):
+    """Как haversine_matrix, но считает расстояния только для пар из булевой матрицы pairs.
+
+    Для остальных пар в матрице NaN.
+    """
+    origins = to_radians_array(origins)
+    destinations = to_radians_array(destinations)
+    rows, columns = np.nonzero(pairs)
+
+    distances = np.full(pairs.shape, np.nan)
+    distances[rows, columns] = haversine(origins[rows], destinations[columns])
+    return distances
+
+
+def rank_by_distance(distances, mask):
+    """Для каждой строки возвращает индексы столбцов по возрастанию расстояния.
+
+    В выдачу попадают только столбцы, разрешённые маской и с известным расстоянием.
+    """
+    masked = np.where(mask & np.isfinite(distances), distances, np.inf)
+    ordered_columns = np.argsort(masked, axis=1, kind='stable')
+    counts = np.isfinite(masked).sum(axis=1)
+    return [
+        columns[:count].tolist()
+        for columns, count in zip(ordered_columns, counts)
+    ]
@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from locations.backends import GeocodingError, aget_coordinates, get_coordinates
+from locations.cache import geocode_cache
+from locations.models import AddressCache
+from locations.normalization import normalize_address
+
+
+logger = logging.getLogger(__name__)
+
+
+background_executor = ThreadPoolExecutor(
+    max_workers=settings.GEOCODER_MAX_WORKERS,
+    thread_name_prefix='geocoder',
+)
+
+
+def fetch_coordinates(geo_apikey, address):
+    if not address:
+        return None
+    return fetch_coordinates_bulk(geo_apikey, [address]).get(address)
+
+
+def geocode_in_background(*addresses):
+    """Кладёт адреса в кэш координат, не задерживая текущий запрос."""
+    if not settings.GEOCODE_IN_BACKGROUND:
+        fetch_coordinates_bulk(settings.GEO_API_KEY, addresses)
+        return
+    background_executor.submit(_geocode_and_release_connection, addresses)
+
+
+def _geocode_and_release_connection(addresses):
+    try:
+        fetch_coordinates_bulk(settings.GEO_API_KEY, addresses)
+    except Exception:
+        logger.exception('Не удалось геокодировать адреса %s', addresses)
+    finally:
+        connections.close_all()
+
+
+# Ссылки на фоновые задачи, чтобы сборщик мусора не удалил их до завершения
+background_tasks = set()
+
+
+async def ageocode_in_background(*addresses):
+    """Как geocode_in_background, но геокодирует в цикле событий ASGI-воркера, а не в потоке."""
+    if not settings.GEOCODE_IN_BACKGROUND:
+        await afetch_coordinates_bulk(settings.GEO_API_KEY, addresses)
+        return
+    task = asyncio.get_running_loop().create_task(_ageocode_and_log(addresses))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def _ageocode_and_log(addresses):
+    try:
+        await afetch_coordinates_bulk(settings.GEO_API_KEY, addresses)
+    except Exception:
+        logger.exception('Не удалось геокодировать адреса %s', addresses)
+
+
+def normalize_addresses(addresses):
+    return {
+        address: normalize_address(address)
+        for address in addresses if address
+    }
+
+
+def fetch_coordinates_bulk(geo_apikey, addresses):
+    """Геокодирует пачку адресов: сначала кэш в памяти, затем один запрос
+    к AddressCache, промахи — параллельно в API.
+
+    Адреса сравниваются после нормализации, так что варианты написания
+    одного адреса делят запись в кэше.
+    Возвращает словарь {адрес: (lon, lat) или None}.
+    """
+    normalized_addresses = normalize_addresses(addresses)
+    keys = {key for key in normalized_addresses.values() if key}
+    if not keys:
+        return {}
+
+    coordinates = geocode_cache.get_many(keys)
+    not_in_memory = keys - coordinates.keys()
+    if not_in_memory:
+        coordinates.update(
+            fetch_stored_and_missing_coordinates(
+                geo_apikey,
+                not_in_memory,
+                normalized_addresses,
+            )
+        )
+        logger.debug('Статистика кэша геокодера: %s', geocode_cache.stats())
+
+    return {
+        address: coordinates.get(key)
+        for address, key in normalized_addresses.items()
+    }
+
+
+async def afetch_coordinates_bulk(geo_apikey, addresses):
+    """Как fetch_coordinates_bulk, но промахи кэша геокодируются асинхронным
+    HTTP-клиентом в цикле событий, а не пулом потоков.
+    """
+    normalized_addresses = normalize_addresses(addresses)
+    keys = {key for key in normalized_addresses.values() if key}
+    if not keys:
+        return {}
+
+    coordinates = await sync_to_async(geocode_cache.get_many)(keys)
+    not_in_memory = keys - coordinates.keys()
+    if not_in_memory:
+        stored = await sync_to_async(load_stored_coordinates)(not_in_memory)
+        coordinates.update(stored)
+
+        missing = sorted(not_in_memory - stored.keys())
+        if missing:
+            address_for_key = get_address_for_key(normalized_addresses, missing)
+            semaphore = asyncio.Semaphore(settings.GEOCODER_MAX_WORKERS)
+
+            async def geocode(key):
+                async with semaphore:
+                    return await ageocode_address(geo_apikey, address_for_key[key])
+
+            api_results = await asyncio.gather(*(geocode(key) for key in missing))
+            coordinates.update(await sync_to_async(store_geocoded)(missing, api_results))
+
+    return {
+        address: coordinates.get(key)
+        for address, key in normalized_addresses.items()
+    }
+
+
+def load_stored_coordinates(keys):
+    """Координаты из AddressCache. Устаревшая запись о сбое геокодера
+    считается промахом, чтобы адрес геокодировался заново.
+    """
+    transient_error_ttl = settings.GEOCODER_STORED_TTL[AddressCache.TRANSIENT_ERROR]
+    retry_failed_before = timezone.now() - timedelta(seconds=transient_error_ttl)
+    stored = {}
+    for cached in AddressCache.objects.filter(address__in=keys):
+        if cached.status == AddressCache.TRANSIENT_ERROR and cached.updated_at < retry_failed_before:
+            continue
+        if cached.lat is None or cached.lon is None:
+            stored[cached.address] = None
+        else:
+            stored[cached.address] = (float(cached.lon), float(cached.lat))
+    geocode_cache.set_many(stored)
+    return stored
+
+
+def get_address_for_key(normalized_addresses, keys):
+    # В API уходит исходное написание адреса: оно понятнее геокодеру, чем ключ
+    return {
+        key: address for address, key in normalized_addresses.items()
+        if key in keys
+    }
+
+
+def store_geocoded(keys, api_results):
+    entries = []
+    failed_keys = []
+    geocoded = {}
+    for key, (status, lon, lat) in zip(keys, api_results):
+        geocoded[key] = (lon, lat) if status == AddressCache.OK else None
+        if status == AddressCache.TRANSIENT_ERROR:
+            failed_keys.append(key)
+        else:
+            entries.append(AddressCache(address=key, lat=lat, lon=lon, status=status))
+
+    # Окончательный ответ геокодера заменяет прежнюю запись о сбое
+    AddressCache.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['address'],
+        update_fields=['lat', 'lon', 'status', 'updated_at'],
+    )
+    if failed_keys:
+        # Сбой не затирает чужие записи, но заново отсчитывает срок прежней записи о сбое
+        AddressCache.objects.bulk_create(
+            [AddressCache(address=key, status=AddressCache.TRANSIENT_ERROR) for key in failed_keys],
+            ignore_conflicts=True,
+        )
+        (
+            AddressCache.objects
+            .filter(address__in=failed_keys, status=AddressCache.TRANSIENT_ERROR)
+            .update(updated_at=timezone.now())
+        )
+    geocode_cache.set_many(geocoded)
+    return geocoded
+
+
+def fetch_stored_and_missing_coordinates(geo_apikey, keys, normalized_addresses):
+    stored = load_stored_coordinates(keys)
+    missing = keys - stored.keys()
+    if not missing:
+        return stored
+
+    address_for_key = get_address_for_key(normalized_addresses, missing)
+    missing = sorted(missing)
+    with ThreadPoolExecutor(max_workers=settings.GEOCODER_MAX_WORKERS) as executor:
+        api_results = list(executor.map(
+            lambda key: geocode_address(geo_apikey, address_for_key[key]),
+            missing,
+        ))
+    return {**stored, **store_geocoded(missing, api_results)}
+
+
+def geocode_address(geo_apikey, address):
+    """Возвращает (статус, lon, lat) для записи в AddressCache."""
+    try:
+        result = get_coordinates(geo_apikey, address)
+    except GeocodingError as e:
+        logger.error(e)
+        return AddressCache.TRANSIENT_ERROR, None, None
+
+    lon, lat = parse_coordinates(result)
+    if lon is None:
+        return AddressCache.NOT_FOUND, None, None
+    return AddressCache.OK, lon, lat
+
+
+async def ageocode_address(geo_apikey, address):
+    try:
+        result = await aget_coordinates(geo_apikey, address)
+    except GeocodingError as e:
+        logger.error(e)
+        return AddressCache.TRANSIENT_ERROR, None, None
+
+    lon, lat = parse_coordinates(result)
+    if lon is None:
+        return AddressCache.NOT_FOUND, None, None
+    return AddressCache.OK, lon, lat
+
+
+def parse_coordinates(result):
+    if not result:
+        return None, None
+    lon, lat = result
+    try:
+        return float(lon), float(lat)
+    except (TypeError, ValueError):
+        return None, None
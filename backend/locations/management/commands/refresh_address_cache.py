@@ -0,0 +1,77 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from locations.cache import geocode_cache
+from locations.geocoder import geocode_address
+from locations.models import AddressCache
+
+
+class Command(BaseCommand):
+    help = (
+        'Перепроверяет устаревшие и неудачные записи кэша координат. '
+        'Запросы к геокодеру идут не чаще --rate в секунду.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Сколько адресов обработать за проход')
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=settings.GEOCODER_REFRESH_RATE,
+            help='Максимум запросов к геокодеру в секунду',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять проход каждые N секунд, 0 — выполнить один раз',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.refresh(options['limit'], options['rate'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def refresh(self, limit, rate):
+        entries = list(
+            AddressCache.objects
+            .expired()
+            .annotate(priority=Case(
+                When(status=AddressCache.TRANSIENT_ERROR, then=Value(0)),
+                When(status=AddressCache.NOT_FOUND, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ))
+            .order_by('priority', 'updated_at')[:limit]
+        )
+
+        refreshed_entries = []
+        pause = 1 / rate
+        for entry in entries:
+            started_at = time.monotonic()
+            status, lon, lat = geocode_address(settings.GEO_API_KEY, entry.address)
+            # Сбой геокодера не должен стирать ранее найденные координаты
+            if status != AddressCache.TRANSIENT_ERROR or entry.status != AddressCache.OK:
+                entry.status, entry.lon, entry.lat = status, lon, lat
+                entry.updated_at = timezone.now()
+                refreshed_entries.append(entry)
+            time.sleep(max(0, pause - (time.monotonic() - started_at)))
+
+        AddressCache.objects.bulk_update(
+            refreshed_entries,
+            ['status', 'lat', 'lon', 'updated_at'],
+            batch_size=500,
+        )
+        geocode_cache.delete_many([entry.address for entry in refreshed_entries])
+
+        found = sum(1 for entry in refreshed_entries if entry.status == AddressCache.OK)
+        self.stdout.write(
+            f'Проверено адресов: {len(entries)}, обновлено: {len(refreshed_entries)}, '
+            f'с координатами: {found}'
+        )
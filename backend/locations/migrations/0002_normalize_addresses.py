@@ -0,0 +1,67 @@
+from collections import defaultdict
+import re
+
+from django.db import migrations
+
+
+# Копия locations.normalization на момент миграции: правки живого кода
+# не должны менять то, что миграция делает на новой базе
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'наб': 'набережная',
+    'ш': 'шоссе',
+    'д': 'дом',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+WORD_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def normalize_address(address):
+    words = WORD_PATTERN.findall(address.casefold().replace('ё', 'е'))
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def normalize_cached_addresses(apps, schema_editor):
+    AddressCache = apps.get_model('locations', 'AddressCache')
+
+    entries_by_key = defaultdict(list)
+    for entry in AddressCache.objects.order_by('-updated_at', '-id'):
+        entries_by_key[normalize_address(entry.address)].append(entry)
+
+    duplicate_ids = []
+    renamed_entries = []
+    for key, entries in entries_by_key.items():
+        located_entries = [entry for entry in entries if entry.lat is not None and entry.lon is not None]
+        kept_entry = (located_entries or entries)[0]
+        duplicate_ids.extend(entry.id for entry in entries if entry.id != kept_entry.id)
+        if kept_entry.address != key:
+            renamed_entries.append((kept_entry.id, key))
+
+    AddressCache.objects.filter(id__in=duplicate_ids).delete()
+    for entry_id, key in renamed_entries:
+        AddressCache.objects.filter(id=entry_id).update(address=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_cached_addresses, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+def mark_unresolved_addresses(apps, schema_editor):
+    # Раньше не различали «адрес не найден» и сбой API: перепроверим все такие адреса
+    AddressCache = apps.get_model('locations', 'AddressCache')
+    AddressCache.objects.filter(lat__isnull=True).update(status='transient_error')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_normalize_addresses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='addresscache',
+            name='status',
+            field=models.CharField(choices=[('ok', 'Найден'), ('not_found', 'Не найден'), ('transient_error', 'Ошибка геокодера')], db_index=True, default='ok', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='addresscache',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления'),
+        ),
+        migrations.RunPython(mark_unresolved_addresses, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class AddressCacheQuerySet(models.QuerySet):
+    def expired(self):
+        now = timezone.now()
+        expired = Q()
+        for status, ttl in settings.GEOCODER_STORED_TTL.items():
+            expired |= Q(status=status, updated_at__lt=now - timedelta(seconds=ttl))
+        return self.filter(expired)
+
 
 class AddressCache(models.Model):
+    OK = 'ok'
+    NOT_FOUND = 'not_found'
+    TRANSIENT_ERROR = 'transient_error'
+    STATUS_CHOICES = (
+        (OK, 'Найден'),
+        (NOT_FOUND, 'Не найден'),
+        (TRANSIENT_ERROR, 'Ошибка геокодера'),
+    )
+
     address = models.CharField("Адрес", max_length=255, unique=True, db_index=True)
     lat = models.FloatField("Широта", null=True)
     lon = models.FloatField("Долгота", null=True)
-    updated_at = models.DateTimeField("Дата обновления", auto_now=True)
+    status = models.CharField(
+        "Статус",
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=OK,
+        db_index=True,
+    )
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True, db_index=True)
+
+    objects = AddressCacheQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.address} ({self.lat}, {self.lon})"
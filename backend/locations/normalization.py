@@ -0,0 +1,36 @@
+import re
+
+
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-д': 'проезд',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'наб': 'набережная',
+    'ш': 'шоссе',
+    'д': 'дом',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+WORD_PATTERN = re.compile(r'\w+(?:-\w+)*')
+
+
+def normalize_address(address):
+    """Приводит адрес к ключу кэша координат.
+
+    Регистр и «ё» не учитываются, знаки препинания и лишние пробелы
+    отбрасываются, сокращения вроде «ул.» раскрываются:
+    «Москва, ул. Тверская,  1» и «москва улица тверская 1» дают один ключ.
+    """
+    words = WORD_PATTERN.findall(address.casefold().replace('ё', 'е'))
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)
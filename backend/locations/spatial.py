@@ -0,0 +1,36 @@
+from collections import defaultdict
+import math
+
+
+KM_PER_DEGREE = 111.32
+
+
+class GridIndex:
+    """Сетка из квадратных в градусах ячеек поверх точек (lon, lat).
+
+    query() возвращает индексы точек из ячеек, задетых кругом заданного
+    радиуса, — надмножество точек в радиусе, точное расстояние считается потом.
+    """
+
+    def __init__(self, points, cell_size_km):
+        self.cell_size = cell_size_km / KM_PER_DEGREE
+        self.cells = defaultdict(list)
+        for index, point in enumerate(points):
+            if point:
+                self.cells[self.get_cell(point)].append(index)
+
+    def get_cell(self, point):
+        lon, lat = point
+        return math.floor(lon / self.cell_size), math.floor(lat / self.cell_size)
+
+    def query(self, point, radius_km):
+        lon, lat = point
+        lat_span = radius_km / KM_PER_DEGREE
+        farthest_lat = min(abs(lat) + lat_span, 89)
+        lon_span = radius_km / (KM_PER_DEGREE * math.cos(math.radians(farthest_lat)))
+
+        min_x, min_y = self.get_cell((lon - lon_span, lat - lat_span))
+        max_x, max_y = self.get_cell((lon + lon_span, lat + lat_span))
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield from self.cells.get((x, y), ())
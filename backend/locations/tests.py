@@ -0,0 +1,428 @@
+from contextlib import AsyncExitStack, ExitStack
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from geopy import distance
+import numpy as np
+
+from locations.cache import GeocodeCache, geocode_cache
+from locations.circuit_breaker import ConcurrencyLimiter, TooManyRequests
+from locations.distance import haversine_matrix, rank_by_distance
+from locations.backends import (
+    GazetteerGeocoder,
+    GeocodingError,
+    aget_coordinates_from_api,
+    geocoder_circuit,
+    geocoder_concurrency,
+    get_coordinates_from_api,
+)
+from locations.geocoder import fetch_coordinates_bulk, geocode_address
+from locations.models import AddressCache
+from locations.normalization import normalize_address
+from locations.spatial import GridIndex
+
+
+class HaversineMatrixTest(SimpleTestCase):
+    orders = [
+        (37.617635, 55.755814),
+        (37.588144, 55.733842),
+        (30.315635, 59.938951),
+    ]
+    restaurants = [
+        (37.620070, 55.753630),
+        (37.530887, 55.703118),
+        (37.842762, 55.682780),
+        (30.360909, 59.931058),
+    ]
+
+    def test_matches_geopy_geodesic(self):
+        distances = haversine_matrix(self.orders, self.restaurants)
+
+        self.assertEqual(distances.shape, (len(self.orders), len(self.restaurants)))
+        for row, (order_lon, order_lat) in enumerate(self.orders):
+            for column, (restaurant_lon, restaurant_lat) in enumerate(self.restaurants):
+                expected = distance.distance(
+                    (order_lat, order_lon),
+                    (restaurant_lat, restaurant_lon),
+                ).km
+                self.assertAlmostEqual(
+                    distances[row, column],
+                    expected,
+                    delta=max(expected * 0.005, 0.01),
+                )
+
+    def test_missing_coordinates_are_nan(self):
+        distances = haversine_matrix([None, self.orders[0]], [self.restaurants[0], None])
+
+        self.assertTrue(np.isnan(distances[0]).all())
+        self.assertTrue(np.isnan(distances[:, 1]).all())
+        self.assertTrue(np.isfinite(distances[1, 0]))
+
+    def test_rank_by_distance_respects_mask(self):
+        distances = haversine_matrix(self.orders, self.restaurants)
+        mask = np.ones(distances.shape, dtype=bool)
+        mask[0, 0] = False
+
+        rankings = rank_by_distance(distances, mask)
+
+        self.assertEqual(rankings[0][-1], 3)
+        self.assertNotIn(0, rankings[0])
+        self.assertEqual(rankings[1], np.argsort(distances[1]).tolist())
+        self.assertEqual(rankings[2][0], 3)
+
+
+class GeocodeCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used_addresses(self):
+        geocode_cache = GeocodeCache(maxsize=2, ttl=60, negative_ttl=10)
+        geocode_cache.set_many({'Тверская 1': (37.6, 55.7), 'Арбат 10': (37.5, 55.7)})
+        geocode_cache.get_many(['Тверская 1'])
+        geocode_cache.set_many({'Ленина 5': None})
+
+        self.assertEqual(
+            geocode_cache.get_many(['Тверская 1', 'Арбат 10', 'Ленина 5']),
+            {'Тверская 1': (37.6, 55.7), 'Ленина 5': None},
+        )
+        self.assertEqual(geocode_cache.stats()['misses'], 1)
+
+    def test_negative_results_expire_sooner(self):
+        geocode_cache = GeocodeCache(maxsize=10, ttl=60, negative_ttl=-1)
+        geocode_cache.set_many({'Тверская 1': (37.6, 55.7), 'Ленина 5': None})
+
+        self.assertEqual(
+            geocode_cache.get_many(['Тверская 1', 'Ленина 5']),
+            {'Тверская 1': (37.6, 55.7)},
+        )
+
+    def test_uses_shared_cache_as_second_tier(self):
+        cache.clear()
+        first_worker = GeocodeCache(maxsize=10, ttl=60, negative_ttl=10, shared_cache_alias='default')
+        second_worker = GeocodeCache(maxsize=10, ttl=60, negative_ttl=10, shared_cache_alias='default')
+        first_worker.set_many({'Тверская 1': (37.6, 55.7), 'Ленина 5': None})
+
+        self.assertEqual(
+            second_worker.get_many(['Тверская 1', 'Ленина 5']),
+            {'Тверская 1': (37.6, 55.7), 'Ленина 5': None},
+        )
+        self.assertEqual(second_worker.stats()['shared_hits'], 2)
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spelling_variants_share_key(self):
+        variants = [
+            'Москва, Тверская 1',
+            'москва тверская, 1',
+            '  Москва,   Тверская 1 ',
+        ]
+        self.assertEqual({normalize_address(address) for address in variants}, {'москва тверская 1'})
+
+    def test_expands_abbreviations(self):
+        self.assertEqual(
+            normalize_address('г. Москва, ул. Ёлочная, д. 5, корп. 2'),
+            'город москва улица елочная дом 5 корпус 2',
+        )
+        self.assertEqual(normalize_address('Пр-т Мира 10'), 'проспект мира 10')
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests_count += 1
+        if self.server.failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({'response': {'GeoObjectCollection': {'featureMember': [
+            {'GeoObject': {'Point': {'pos': '37.613 55.757'}}},
+        ]}}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GeocoderCircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeocoderHandler)
+        self.server.requests_count = 0
+        self.server.failing = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        geocoder_url = f'http://127.0.0.1:{self.server.server_port}/1.x'
+        settings_override = override_settings(YANDEX_GEOCODER_URL=geocoder_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        geocoder_circuit.reset()
+        self.addCleanup(geocoder_circuit.reset)
+
+    def test_opens_after_repeated_failures(self):
+        for _ in range(geocoder_circuit.failure_threshold + 3):
+            with self.assertRaises(GeocodingError):
+                get_coordinates_from_api('key', 'Москва, Тверская 1')
+
+        self.assertEqual(self.server.requests_count, geocoder_circuit.failure_threshold)
+
+    def test_closes_after_successful_trial_call(self):
+        for _ in range(geocoder_circuit.failure_threshold):
+            with self.assertRaises(GeocodingError):
+                get_coordinates_from_api('key', 'Москва, Тверская 1')
+
+        self.server.failing = False
+        cache.set(geocoder_circuit.opened_until_key, 0, None)
+
+        self.assertEqual(get_coordinates_from_api('key', 'Москва, Тверская 1'), ('37.613', '55.757'))
+        self.assertEqual(get_coordinates_from_api('key', 'Москва, Тверская 1'), ('37.613', '55.757'))
+        self.assertEqual(self.server.requests_count, geocoder_circuit.failure_threshold + 2)
+
+    async def test_async_client_shares_circuit(self):
+        with ExitStack() as sync_calls:
+            # Синхронные вызовы кэша заблокировали бы цикл событий
+            for obj, name in [
+                (geocoder_circuit, 'before_call'),
+                (geocoder_circuit, 'record_success'),
+                (geocoder_circuit, 'record_failure'),
+                (geocoder_concurrency, 'acquire'),
+            ]:
+                sync_calls.enter_context(mock.patch.object(obj, name, side_effect=AssertionError(name)))
+
+            for _ in range(geocoder_circuit.failure_threshold + 1):
+                with self.assertRaises(GeocodingError):
+                    await aget_coordinates_from_api('key', 'Москва, Тверская 1')
+            self.assertEqual(self.server.requests_count, geocoder_circuit.failure_threshold)
+
+            self.server.failing = False
+            await cache.aset(geocoder_circuit.opened_until_key, 0, None)
+            self.assertEqual(await aget_coordinates_from_api('key', 'Москва, Тверская 1'), ('37.613', '55.757'))
+
+        self.assertIsNone(cache.get(geocoder_circuit.opened_until_key))
+
+
+class ConcurrencyLimiterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        time_patcher = mock.patch('time.time', lambda: self.now)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+    def test_limits_concurrent_calls(self):
+        limiter = ConcurrencyLimiter('test', limit=2, lease_timeout=10)
+        with limiter.acquire(), limiter.acquire():
+            with self.assertRaises(TooManyRequests):
+                with limiter.acquire():
+                    pass
+        with limiter.acquire(), limiter.acquire():
+            pass
+
+    def test_each_call_has_own_lease(self):
+        limiter = ConcurrencyLimiter('test', limit=1, lease_timeout=10)
+        with limiter.acquire():
+            pass
+
+        self.now += 9
+        with limiter.acquire():
+            # Аренда первого вызова истекла бы сейчас, но слот занят вторым
+            self.now += 2
+            with self.assertRaises(TooManyRequests):
+                with limiter.acquire():
+                    pass
+
+    def test_stale_call_does_not_release_slot_of_another(self):
+        limiter = ConcurrencyLimiter('test', limit=1, lease_timeout=10)
+        with ExitStack() as next_call:
+            with limiter.acquire():
+                self.now += 11
+                next_call.enter_context(limiter.acquire())
+
+            with self.assertRaises(TooManyRequests):
+                with limiter.acquire():
+                    pass
+
+        with limiter.acquire():
+            pass
+
+
+    async def test_async_calls_share_slots_with_sync_calls(self):
+        limiter = ConcurrencyLimiter('test', limit=2, lease_timeout=10)
+        async with AsyncExitStack() as calls:
+            await calls.enter_async_context(limiter.aacquire())
+            with limiter.acquire():
+                with self.assertRaises(TooManyRequests):
+                    async with limiter.aacquire():
+                        pass
+        async with limiter.aacquire(), limiter.aacquire():
+            pass
+
+
+class GazetteerGeocoderTest(SimpleTestCase):
+    def setUp(self):
+        gazetteer = tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8')
+        self.addCleanup(gazetteer.close)
+        gazetteer.write(
+            'address,lon,lat\n'
+            '"Москва, ул. Тверская, 1",37.613,55.757\n'
+            '"Москва, ул. Тверская, 12",37.606,55.765\n'
+        )
+        gazetteer.flush()
+        self.geocoder = GazetteerGeocoder(gazetteer.name)
+
+    def test_finds_normalized_address(self):
+        self.assertEqual(self.geocoder.geocode(None, 'москва улица тверская 12'), ('37.606', '55.765'))
+
+    def test_matches_longest_known_prefix(self):
+        self.assertEqual(
+            self.geocoder.geocode(None, 'Москва, ул. Тверская, 1, кв. 12'),
+            ('37.613', '55.757'),
+        )
+        self.assertIsNone(self.geocoder.geocode(None, 'Москва, ул. Тверская, 15'))
+
+    def test_missing_gazetteer_is_geocoding_error(self):
+        with self.assertRaises(GeocodingError):
+            GazetteerGeocoder('/nonexistent/gazetteer.csv').geocode(None, 'Москва')
+
+
+class GridIndexTest(SimpleTestCase):
+    def test_returns_all_points_within_radius(self):
+        center = (37.617635, 55.755814)
+        points = [
+            (37.620070, 55.753630),
+            (37.530887, 55.703118),
+            (37.842762, 55.682780),
+            (30.360909, 59.931058),
+            None,
+        ]
+        grid = GridIndex(points, cell_size_km=2)
+        distances = haversine_matrix([center], points)[0]
+
+        for radius in [1, 5, 10, 20]:
+            with self.subTest(radius=radius):
+                candidates = set(grid.query(center, radius))
+                within_radius = {index for index, km in enumerate(distances) if km <= radius}
+                self.assertLessEqual(within_radius, candidates)
+                self.assertNotIn(3, candidates)
+
+
+@override_settings(GEOCODER_STORED_TTL={'ok': 1000, 'not_found': 100, 'transient_error': 10})
+class AddressCacheTest(TestCase):
+    def setUp(self):
+        geocode_cache.clear()
+
+    def create_entry(self, address, status, age, lat=None, lon=None):
+        entry = AddressCache.objects.create(address=address, status=status, lat=lat, lon=lon)
+        AddressCache.objects.filter(pk=entry.pk).update(updated_at=timezone.now() - timedelta(seconds=age))
+        return entry
+
+    def test_classifies_geocoder_results(self):
+        results = [('37.613', '55.757'), None, GeocodingError('Геокодер недоступен')]
+        with mock.patch('locations.geocoder.get_coordinates', side_effect=results):
+            self.assertEqual(geocode_address('key', 'Тверская 1'), (AddressCache.OK, 37.613, 55.757))
+            self.assertEqual(geocode_address('key', 'Нигде 0'), (AddressCache.NOT_FOUND, None, None))
+            with self.assertLogs('locations.geocoder', 'ERROR'):
+                self.assertEqual(geocode_address('key', 'Тверская 1'), (AddressCache.TRANSIENT_ERROR, None, None))
+
+    def test_expired_uses_ttl_of_each_status(self):
+        self.create_entry('свежий', AddressCache.OK, 500, lat=55.7, lon=37.6)
+        self.create_entry('старый', AddressCache.OK, 1500, lat=55.7, lon=37.6)
+        self.create_entry('не найден', AddressCache.NOT_FOUND, 500)
+        self.create_entry('сбой', AddressCache.TRANSIENT_ERROR, 20)
+        self.create_entry('недавний сбой', AddressCache.TRANSIENT_ERROR, 5)
+
+        self.assertEqual(
+            set(AddressCache.objects.expired().values_list('address', flat=True)),
+            {'старый', 'не найден', 'сбой'},
+        )
+
+    def test_refresh_retries_failures_first_and_keeps_coordinates(self):
+        self.create_entry('старый', AddressCache.OK, 1500, lat=55.7, lon=37.6)
+        self.create_entry('не найден', AddressCache.NOT_FOUND, 500)
+        self.create_entry('сбой', AddressCache.TRANSIENT_ERROR, 20)
+
+        failure = (AddressCache.TRANSIENT_ERROR, None, None)
+        with mock.patch(
+            'locations.management.commands.refresh_address_cache.geocode_address',
+            return_value=failure,
+        ) as geocode:
+            call_command('refresh_address_cache', rate=1000, stdout=io.StringIO())
+
+        self.assertEqual(
+            [call.args[1] for call in geocode.call_args_list],
+            ['сбой', 'не найден', 'старый'],
+        )
+        old_entry = AddressCache.objects.get(address='старый')
+        self.assertEqual((old_entry.status, old_entry.lat, old_entry.lon), (AddressCache.OK, 55.7, 37.6))
+        self.assertEqual(AddressCache.objects.get(address='не найден').status, AddressCache.TRANSIENT_ERROR)
+
+    def test_expired_failure_is_geocoded_again_on_request(self):
+        self.create_entry(normalize_address('Москва, Тверская 1'), AddressCache.TRANSIENT_ERROR, 20)
+        self.create_entry(normalize_address('Москва, Арбат 10'), AddressCache.TRANSIENT_ERROR, 5)
+
+        with mock.patch('locations.geocoder.get_coordinates', return_value=('37.613', '55.757')) as geocode:
+            coordinates = fetch_coordinates_bulk('key', ['Москва, Тверская 1', 'Москва, Арбат 10'])
+
+        geocode.assert_called_once_with('key', 'Москва, Тверская 1')
+        self.assertEqual(
+            coordinates,
+            {'Москва, Тверская 1': (37.613, 55.757), 'Москва, Арбат 10': None},
+        )
+        entry = AddressCache.objects.get(address=normalize_address('Москва, Тверская 1'))
+        self.assertEqual((entry.status, entry.lon, entry.lat), (AddressCache.OK, 37.613, 55.757))
+
+    def test_repeated_failure_restarts_retry_timer(self):
+        self.create_entry(normalize_address('Москва, Тверская 1'), AddressCache.TRANSIENT_ERROR, 20)
+
+        with (
+            mock.patch('locations.geocoder.get_coordinates', side_effect=GeocodingError('Геокодер недоступен')),
+            self.assertLogs('locations.geocoder', 'ERROR'),
+        ):
+            self.assertEqual(fetch_coordinates_bulk('key', ['Москва, Тверская 1']), {'Москва, Тверская 1': None})
+
+        self.assertFalse(AddressCache.objects.expired().exists())
+
+
+class NormalizeAddressesMigrationTest(TransactionTestCase):
+    migrate_from = [('locations', '0001_initial')]
+    migrate_to = [('locations', '0002_normalize_addresses')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.addCleanup(self.migrate_to_latest)
+        self.old_apps = executor.loader.project_state(self.migrate_from).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps
+
+    def test_merges_addresses_with_same_key(self):
+        OldAddressCache = self.old_apps.get_model('locations', 'AddressCache')
+        OldAddressCache.objects.create(address='Москва, Тверская 1', lat=55.757, lon=37.613)
+        OldAddressCache.objects.create(address='  москва   ТВЕРСКАЯ 1 ')
+        OldAddressCache.objects.create(address='Москва, Арбат 10', lat=55.751, lon=37.594)
+
+        NewAddressCache = self.migrate().get_model('locations', 'AddressCache')
+
+        self.assertEqual(
+            set(NewAddressCache.objects.values_list('address', 'lat', 'lon')),
+            {('москва тверская 1', 55.757, 37.613), ('москва арбат 10', 55.751, 37.594)},
+        )
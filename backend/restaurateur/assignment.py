@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from foodcartapp.models import Order, OrderStatusTransition, Restaurant
+from foodcartapp.signals import orders_changed
+from locations.distance import rank_by_distance
+from restaurateur.board import get_can_cook_matrix, get_delivery_distances
+
+
+ACTIVE_STATUSES = ['assembled', 'delivery']
+
+
+def choose_restaurants(rankings, capacities):
+    """Раздаёт заказы ресторанам по очереди: каждый заказ получает ближайший
+    ресторан, у которого ещё есть свободные места.
+
+    rankings — столбцы ресторанов по возрастанию расстояния для каждого заказа,
+    capacities — свободные места по столбцам, None — без ограничений.
+    Возвращает столбец ресторана или None для каждого заказа.
+    """
+    capacities = list(capacities)
+    choices = []
+    for columns in rankings:
+        choice = None
+        for column in columns:
+            if capacities[column] is None:
+                choice = column
+                break
+            if capacities[column] > 0:
+                capacities[column] -= 1
+                choice = column
+                break
+        choices.append(choice)
+    return choices
+
+
+def get_free_capacities(restaurants):
+    """Свободные места ресторанов по столбцам, None — без ограничений.
+
+    Вызывается в транзакции: строки ресторанов блокируются до её конца, так что
+    параллельные назначения по очереди видят места, занятые друг другом.
+    """
+    max_active_orders = dict(
+        Restaurant.objects
+        .filter(id__in=[restaurant.id for restaurant in restaurants])
+        .select_for_update()
+        .order_by('id')
+        .values_list('id', 'max_active_orders')
+    )
+    active_orders = dict(
+        Restaurant.objects
+        .annotate(active_orders=Count('order', filter=Q(order__status__in=ACTIVE_STATUSES)))
+        .values_list('id', 'active_orders')
+    )
+    capacities = []
+    for restaurant in restaurants:
+        if restaurant.id not in max_active_orders:
+            # Ресторан удалили, пока считались расстояния
+            capacities.append(0)
+        elif max_active_orders[restaurant.id] is None:
+            capacities.append(None)
+        else:
+            capacities.append(max(max_active_orders[restaurant.id] - active_orders.get(restaurant.id, 0), 0))
+    return capacities
+
+
+def rank_restaurants(orders, restaurants):
+    """Для каждого заказа — столбцы ресторанов, которые могут его приготовить
+    и доставить, по возрастанию расстояния.
+    """
+    can_cook = get_can_cook_matrix(orders, restaurants)
+    distances, _ = get_delivery_distances(orders, restaurants, can_cook)
+    return rank_by_distance(distances, can_cook)
+
+
+def assign_raw_orders(orders=None):
+    """Назначает необработанным заказам ближайшие рестораны, которые могут их
+    приготовить, с учётом загрузки ресторанов.
+
+    Расстояния и геокодирование считаются до транзакции, чтобы не держать
+    блокировки заказов во время запросов к геокодеру. В транзакции заказы
+    блокируются и перепроверяются: заказы, которые успели обработать,
+    пропускаются, а свободные места считаются под блокировкой ресторанов.
+    Старые заказы получают рестораны первыми. Возвращает число
+    назначенных и оставшихся без ресторана заказов.
+    """
+    if orders is None:
+        orders = Order.objects.all()
+
+    candidates = list(
+        orders
+        .filter(status='raw', restaurant__isnull=True)
+        .prefetch_related('details')
+        .order_by('registered_at', 'id')
+    )
+    restaurants = list(Restaurant.objects.order_by('id'))
+    rankings = dict(zip(
+        (order.id for order in candidates),
+        rank_restaurants(candidates, restaurants),
+    ))
+
+    with transaction.atomic():
+        orders = list(
+            Order.objects
+            .filter(id__in=rankings, status='raw', restaurant__isnull=True)
+            .select_for_update(skip_locked=True)
+            .order_by('registered_at', 'id')
+        )
+        choices = choose_restaurants(
+            [rankings[order.id] for order in orders],
+            get_free_capacities(restaurants),
+        )
+
+        now = timezone.now()
+        assigned_orders = []
+        transitions = []
+        for order, column in zip(orders, choices):
+            if column is None:
+                continue
+            order.restaurant = restaurants[column]
+            transitions.append(order.change_status('assembled', now))
+            order.updated_at = now
+            assigned_orders.append(order)
+
+        Order.objects.bulk_update(
+            assigned_orders,
+            ['restaurant', 'status', 'called_at', 'updated_at'],
+            batch_size=1000,
+        )
+        OrderStatusTransition.objects.bulk_create(transitions, batch_size=1000)
+        orders_changed.send(sender=Order, order_ids=[order.id for order in assigned_orders])
+    return len(assigned_orders), len(orders) - len(assigned_orders)
@@ -0,0 +1,210 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+import numpy as np
+
+from foodcartapp.availability import (
+    get_availability_index,
+    get_restaurants_mask,
+    iter_mask_columns,
+)
+from foodcartapp.models import Order, Restaurant
+from locations.distance import haversine_sparse_matrix, rank_by_distance
+from locations.geocoder import fetch_coordinates_bulk
+from locations.spatial import GridIndex
+
+
+def get_board_orders(status=None, date_from=None, date_to=None, price_from=None, price_to=None, ordering=None):
+    orders = Order.objects.select_related('restaurant').prefetch_related('details')
+    if status:
+        orders = orders.filter(status=status)
+    else:
+        orders = orders.exclude(status='ready')
+    if date_from:
+        orders = orders.filter(registered_at__date__gte=date_from)
+    if date_to:
+        orders = orders.filter(registered_at__date__lte=date_to)
+    if price_from is not None:
+        orders = orders.filter(total_price__gte=price_from)
+    if price_to is not None:
+        orders = orders.filter(total_price__lte=price_to)
+    if ordering:
+        return orders.order_by(ordering, 'id')
+    return orders.order_by('-status', 'id')
+
+
+def get_changed_orders(since, after_id=0):
+    """Заказы, изменённые после отметки (since, after_id), в порядке изменения."""
+    return (
+        Order.objects
+        .filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=after_id))
+        .select_related('restaurant')
+        .prefetch_related('details')
+        .order_by('updated_at', 'id')
+    )
+
+
+def get_orders_watermark():
+    latest = Order.objects.order_by('-updated_at', '-id').values('updated_at', 'id').first()
+    if not latest:
+        return None
+    return make_committed_watermark(latest['updated_at'], latest['id'])
+
+
+def make_committed_watermark(since, after_id):
+    """Отметка не новее, чем ORDER_CHANGES_COMMIT_LAG секунд назад.
+
+    updated_at ставится до коммита: транзакция, которая закоммитится позже,
+    может получить время раньше уже выданной отметки. Поэтому последние
+    секунды перечитываются при следующем запросе изменений.
+    """
+    committed_before = timezone.now() - timedelta(seconds=settings.ORDER_CHANGES_COMMIT_LAG)
+    if since > committed_before:
+        return make_watermark(committed_before, 0)
+    return make_watermark(since, after_id)
+
+
+def make_watermark(since, after_id):
+    # isoformat сохраняет микросекунды, которые JSON-энкодер Django отбрасывает
+    return {'since': since.isoformat(), 'after_id': after_id}
+
+
+def get_can_cook_matrix(orders, restaurants):
+    """Матрица заказы × рестораны: True, если ресторан может приготовить весь заказ."""
+    restaurant_columns = {
+        restaurant.id: column for column, restaurant in enumerate(restaurants)
+    }
+    availability_index = get_availability_index()
+    # Номера ресторанов в индексе доступности → столбцы матрицы
+    index_columns = [
+        restaurant_columns.get(restaurant_id)
+        for restaurant_id in availability_index['restaurant_ids']
+    ]
+
+    can_cook = np.zeros((len(orders), len(restaurants)), dtype=bool)
+    for row, order in enumerate(orders):
+        product_ids = [detail.product_id for detail in order.details.all()]
+        restaurants_mask = get_restaurants_mask(availability_index, product_ids)
+        for index_column in iter_mask_columns(restaurants_mask):
+            column = index_columns[index_column]
+            if column is not None:
+                can_cook[row, column] = True
+    return can_cook
+
+
+def get_points(orders, restaurants, can_cook):
+    """Координаты заказов и тех ресторанов, которые могут приготовить хоть один заказ."""
+    needed_restaurants = can_cook.any(axis=0)
+    addresses = {order.address for order in orders}
+    addresses.update(
+        restaurant.address
+        for restaurant, needed in zip(restaurants, needed_restaurants)
+        if needed and not restaurant.coordinates
+    )
+    coordinates = fetch_coordinates_bulk(settings.GEO_API_KEY, addresses)
+
+    order_points = [coordinates.get(order.address) for order in orders]
+    restaurant_points = [
+        (restaurant.coordinates or coordinates.get(restaurant.address)) if needed else None
+        for restaurant, needed in zip(restaurants, needed_restaurants)
+    ]
+    return order_points, restaurant_points
+
+
+def get_nearby_matrix(order_points, restaurant_points, radius_km):
+    """Матрица заказы × рестораны: True, если ресторан в соседних с заказом ячейках сетки."""
+    grid = GridIndex(restaurant_points, settings.DELIVERY_GRID_CELL_KM)
+    nearby = np.zeros((len(order_points), len(restaurant_points)), dtype=bool)
+    for row, point in enumerate(order_points):
+        if point:
+            nearby[row, list(grid.query(point, radius_km))] = True
+    return nearby
+
+
+def get_delivery_distances(orders, restaurants, can_cook):
+    """Расстояния от заказов до ресторанов, которые могут их приготовить и доставить."""
+    order_points, restaurant_points = get_points(orders, restaurants, can_cook)
+    radii = [restaurant.effective_delivery_radius_km for restaurant in restaurants]
+    distances = compute_delivery_distances(order_points, restaurant_points, radii, can_cook)
+    located_orders = np.array([point is not None for point in order_points], dtype=bool)
+    return distances, located_orders
+
+
+def compute_delivery_distances(order_points, restaurant_points, radii, can_cook):
+    """Расстояния считаются только до ресторанов из ближайших ячеек сетки,
+    пары дальше радиуса доставки ресторана остаются NaN.
+    """
+    radii = np.array(radii, dtype=float)
+    nearby = get_nearby_matrix(order_points, restaurant_points, radii.max(initial=0))
+    distances = haversine_sparse_matrix(order_points, restaurant_points, can_cook & nearby)
+    distances[~(distances <= radii)] = np.nan
+    return distances
+
+
+def build_order_items(orders):
+    """Строки доски менеджера: заказ, его стоимость и ближайшие рестораны.
+
+    Число запросов к БД не зависит от количества заказов: заказы и их состав
+    загружаются заранее, а рестораны, доступность и координаты — пачками.
+    """
+    orders = list(orders)
+    restaurants = list(Restaurant.objects.order_by('id'))
+    can_cook = get_can_cook_matrix(orders, restaurants)
+    distances, located_orders = get_delivery_distances(orders, restaurants, can_cook)
+    rankings = rank_by_distance(distances, can_cook)
+
+    order_items = []
+    for row, (order, columns) in enumerate(zip(orders, rankings)):
+        order_items.append({
+            'order': order,
+            'located': located_orders[row],
+            'total_price': order.total_price,
+            'restaurants': [
+                {
+                    'restaurant_name': restaurants[column].name,
+                    'distance': round(float(distances[row, column]), 2),
+                }
+                for column in columns
+            ],
+        })
+    return order_items
+
+
+def serialize_order(order):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'payment_method': order.payment_method,
+        'firstname': order.firstname,
+        'lastname': order.lastname,
+        'phonenumber': str(order.phonenumber),
+        'address': order.address,
+        'comment': order.comment,
+        'restaurant': order.restaurant_id,
+        'registered_at': order.registered_at,
+        'called_at': order.called_at,
+        'delivered_at': order.delivered_at,
+        'updated_at': order.updated_at,
+        'total_price': order.total_price,
+        'products': [
+            {
+                'product': detail.product_id,
+                'quantity': detail.quantity,
+                'price': detail.price,
+            }
+            for detail in order.details.all()
+        ],
+    }
+
+
+def serialize_order_changes(orders):
+    """Изменившиеся заказы для обновления доски менеджера в браузере."""
+    return [
+        {
+            **serialize_order(item['order']),
+            'restaurants': item['restaurants'],
+        }
+        for item in build_order_items(orders)
+    ]
@@ -0,0 +1,223 @@
+import asyncio
+from functools import partial
+import logging
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections, transaction
+
+from foodcartapp.models import Order
+from foodcartapp.streaming import dump_json
+from restaurateur.board import make_watermark, serialize_order_changes
+
+
+logger = logging.getLogger(__name__)
+
+
+ORDERS_CHANNEL = 'orders_changed'
+# NOTIFY принимает не больше 8000 байт
+NOTIFY_PAYLOAD_SIZE = 7900
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTENER_RECONNECT_DELAY = 5
+CLIENT_RETRY_MS = 5000
+
+
+def uses_pg_notify():
+    return connection.vendor == 'postgresql'
+
+
+def split_payload(order_ids):
+    payload = []
+    size = 0
+    for order_id in order_ids:
+        order_id = str(order_id)
+        if payload and size + len(order_id) + 1 > NOTIFY_PAYLOAD_SIZE:
+            yield ','.join(payload)
+            payload, size = [], 0
+        payload.append(order_id)
+        size += len(order_id) + 1
+    if payload:
+        yield ','.join(payload)
+
+
+def notify_orders_changed(order_ids):
+    """Сообщает открытым доскам менеджеров об изменившихся заказах.
+
+    В PostgreSQL — через NOTIFY: его получат все процессы, и только после
+    коммита транзакции. В остальных БД — подписчикам текущего процесса.
+    """
+    order_ids = sorted(set(order_ids))
+    if not order_ids:
+        return
+    if uses_pg_notify():
+        with connection.cursor() as cursor:
+            for payload in split_payload(order_ids):
+                cursor.execute('SELECT pg_notify(%s, %s)', [ORDERS_CHANNEL, payload])
+    else:
+        transaction.on_commit(partial(order_events.publish, order_ids))
+
+
+class Subscriber:
+    def __init__(self, loop=None):
+        self.loop = loop
+        if loop:
+            self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        else:
+            self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, payload):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.put_nowait, payload)
+        else:
+            self.put_nowait(payload)
+
+    def put_nowait(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except (queue.Full, asyncio.QueueFull):
+            # Клиент не успевает читать, он догонит изменения по отметке
+            pass
+
+
+class OrderEventsBroadcaster:
+    """Раздаёт изменения заказов подписчикам процесса.
+
+    Фоновый поток собирает id изменившихся заказов в пачку, один раз считает
+    для неё строки доски и рассылает готовый JSON всем подписчикам, так что
+    число открытых вкладок не умножает запросы к БД и геокодеру.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.changed_ids = queue.SimpleQueue()
+        self.started = False
+
+    def subscribe(self, loop=None):
+        subscriber = Subscriber(loop)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if not self.started:
+                self.started = True
+                threading.Thread(target=self.run, name='order-events', daemon=True).start()
+                if uses_pg_notify():
+                    threading.Thread(target=self.listen, name='order-events-listener', daemon=True).start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, order_ids):
+        if self.started:
+            self.changed_ids.put(order_ids)
+
+    def run(self):
+        while True:
+            order_ids = set(self.changed_ids.get())
+            # Изменения, пришедшие почти одновременно, уходят одним событием
+            deadline = time.monotonic() + settings.ORDER_EVENTS_BATCH_DELAY
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    order_ids.update(self.changed_ids.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            close_old_connections()
+            try:
+                self.broadcast(order_ids)
+            except Exception:
+                logger.exception('Не удалось разослать изменения заказов')
+            finally:
+                close_old_connections()
+
+    def broadcast(self, order_ids):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+
+        payload = self.build_payload(order_ids)
+        for subscriber in subscribers:
+            subscriber.put(payload)
+
+    def build_payload(self, order_ids):
+        orders = list(
+            Order.objects
+            .filter(id__in=order_ids)
+            .select_related('restaurant')
+            .prefetch_related('details')
+            .order_by('updated_at', 'id')
+        )
+        return dump_json({
+            'orders': serialize_order_changes(orders),
+            'watermark': make_watermark(orders[-1].updated_at, orders[-1].id) if orders else None,
+        }).decode()
+
+    def listen(self):
+        while True:
+            try:
+                self.listen_notifications()
+            except Exception:
+                logger.exception('Потеряно соединение LISTEN, переподключаемся')
+                time.sleep(LISTENER_RECONNECT_DELAY)
+
+    def listen_notifications(self):
+        listener = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            listener.ensure_connection()
+            listener.set_autocommit(True)
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {ORDERS_CHANNEL}')
+
+            raw_connection = listener.connection
+            while True:
+                if not select.select([raw_connection], [], [], settings.ORDER_EVENTS_KEEPALIVE)[0]:
+                    continue
+                raw_connection.poll()
+                while raw_connection.notifies:
+                    notification = raw_connection.notifies.pop(0)
+                    self.publish([int(order_id) for order_id in notification.payload.split(',')])
+        finally:
+            listener.close()
+
+
+order_events = OrderEventsBroadcaster()
+
+
+def format_event(payload):
+    return f'event: orders\ndata: {payload}\n\n'
+
+
+def iter_order_events():
+    """Поток событий для WSGI: каждый клиент занимает поток сервера."""
+    subscriber = order_events.subscribe()
+    try:
+        yield f'retry: {CLIENT_RETRY_MS}\n\n'
+        while True:
+            try:
+                payload = subscriber.queue.get(timeout=settings.ORDER_EVENTS_KEEPALIVE)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(payload)
+    finally:
+        order_events.unsubscribe(subscriber)
+
+
+async def aiter_order_events():
+    """Поток событий для ASGI: клиенты ждут событий в цикле событий, не занимая потоков."""
+    subscriber = order_events.subscribe(asyncio.get_running_loop())
+    try:
+        yield f'retry: {CLIENT_RETRY_MS}\n\n'
+        while True:
+            try:
+                payload = await asyncio.wait_for(subscriber.queue.get(), settings.ORDER_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield format_event(payload)
+    finally:
+        order_events.unsubscribe(subscriber)
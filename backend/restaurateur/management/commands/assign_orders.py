@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from restaurateur.assignment import assign_raw_orders
+
+
+class Command(BaseCommand):
+    help = 'Назначает необработанным заказам ближайшие подходящие рестораны'
+
+    def handle(self, *args, **options):
+        assigned, unassigned = assign_raw_orders()
+        self.stdout.write(f'Назначено заказов: {assigned}, осталось без ресторана: {unassigned}')
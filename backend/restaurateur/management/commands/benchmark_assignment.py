@@ -0,0 +1,122 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+import numpy as np
+
+from foodcartapp.availability import invalidate_availability_index
+from foodcartapp.models import Order, OrderDetails, Product, Restaurant, RestaurantMenuItem
+from locations.models import AddressCache
+from locations.normalization import normalize_address
+from restaurateur.assignment import assign_raw_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет assign_raw_orders целиком на синтетических необработанных заказах: '
+        'загрузку заказов, блокировки, bulk_update и запись переходов статусов. '
+        'Координаты заказов заранее лежат в кэше адресов, геокодер не вызывается. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--restaurants', type=int, default=300)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--radius', type=float, default=10, help='Радиус доставки, км')
+        parser.add_argument('--capacity', type=int, default=30, help='Мест в каждом ресторане')
+        parser.add_argument(
+            '--menu-coverage',
+            type=float,
+            default=0.7,
+            help='Доля товаров в меню каждого ресторана',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            orders = self.seed(options)
+            invalidate_availability_index()
+            with CaptureQueriesContext(connection) as queries:
+                started_at = time.perf_counter()
+                assigned, unassigned = assign_raw_orders(orders)
+                elapsed = time.perf_counter() - started_at
+            self.report(assigned, unassigned, elapsed, len(queries))
+            transaction.set_rollback(True)
+        invalidate_availability_index()
+
+    def seed(self, options):
+        random = np.random.default_rng(options['seed'])
+
+        def random_points(count):
+            lon = random.uniform(37.35, 37.85, count)
+            lat = random.uniform(55.57, 55.91, count)
+            return zip(lon.tolist(), lat.tolist())
+
+        self.stdout.write('Создаю тестовые данные...')
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(
+                name=f'Бенчмарк, ресторан {number}',
+                address=f'Бенчмарк, ресторан {number}',
+                lon=lon,
+                lat=lat,
+                delivery_radius_km=options['radius'],
+                max_active_orders=options['capacity'],
+            )
+            for number, (lon, lat) in enumerate(random_points(options['restaurants']))
+        )
+        products = Product.objects.bulk_create(
+            Product(name=f'Бенчмарк, товар {number}', price=100, image='benchmark.jpg')
+            for number in range(options['products'])
+        )
+        RestaurantMenuItem.objects.bulk_create(
+            (
+                RestaurantMenuItem(restaurant=restaurant, product=product)
+                for restaurant in restaurants
+                for product in products
+                if random.random() < options['menu_coverage']
+            ),
+            batch_size=5000,
+        )
+
+        addresses = [f'Бенчмарк, заказ {number}' for number in range(options['orders'])]
+        AddressCache.objects.bulk_create(
+            (
+                AddressCache(address=normalize_address(address), lon=lon, lat=lat)
+                for address, (lon, lat) in zip(addresses, random_points(len(addresses)))
+            ),
+            batch_size=5000,
+        )
+        orders = Order.objects.bulk_create(
+            (
+                Order(
+                    address=address,
+                    firstname='Бенчмарк',
+                    lastname='Тест',
+                    phonenumber='+79991234567',
+                )
+                for address in addresses
+            ),
+            batch_size=5000,
+        )
+        OrderDetails.objects.bulk_create(
+            (
+                OrderDetails(order=order, product=products[product_index], quantity=1, price=100)
+                for order in orders
+                for product_index in random.choice(len(products), random.integers(1, 4), replace=False)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(
+            f'Заказов: {len(orders)}, ресторанов: {len(restaurants)}, товаров: {len(products)}'
+        )
+        return Order.objects.filter(id__in=[order.id for order in orders])
+
+    def report(self, assigned, unassigned, elapsed, query_count):
+        self.stdout.write(self.style.MIGRATE_HEADING('\nassign_raw_orders'))
+        self.stdout.write(f'назначено: {assigned}, без ресторана: {unassigned}')
+        self.stdout.write(
+            f'время: {elapsed * 1000:.0f} мс, {(assigned + unassigned) / elapsed:.0f} заказов/с, '
+            f'запросов к БД: {query_count}'
+        )
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from foodcartapp.models import Order
+from foodcartapp.signals import orders_changed
+from restaurateur.events import notify_orders_changed
+
+
+@receiver(post_save, sender=Order)
+def announce_order_change(sender, instance, **kwargs):
+    notify_orders_changed([instance.id])
+
+
+@receiver(orders_changed, sender=Order)
+def announce_orders_changes(sender, order_ids, **kwargs):
+    notify_orders_changed(order_ids)
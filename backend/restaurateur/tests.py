@@ -1,3 +1,429 @@
-from django.test import TestCase
+from datetime import timedelta
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from foodcartapp.models import (
+    Order,
+    OrderDetails,
+    OrderStatusTransition,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+from locations.cache import geocode_cache
+from locations.distance import haversine_matrix
+from locations.models import AddressCache
+from locations.normalization import normalize_address
+from restaurateur.assignment import assign_raw_orders, choose_restaurants, rank_restaurants
+from restaurateur.board import build_order_items, compute_delivery_distances, make_watermark
+from restaurateur.events import OrderEventsBroadcaster, Subscriber, order_events
+
+
+class OrdersBoardQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(self.manager)
+
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.restaurants = [
+            Restaurant.objects.create(name='Первый', address='Москва, Тверская 1', lat=55.757, lon=37.613),
+            Restaurant.objects.create(name='Второй', address='Москва, Арбат 10', lat=55.751, lon=37.594),
+        ]
+        for restaurant in self.restaurants:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+
+    def create_orders(self, count):
+        AddressCache.objects.bulk_create(
+            AddressCache(address=normalize_address(f'Москва, Заказная {number}'), lat=55.7, lon=37.6)
+            for number in range(count)
+        )
+        orders = Order.objects.bulk_create(
+            Order(
+                address=f'Москва, Заказная {number}',
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79001234567',
+                restaurant=self.restaurants[0] if number % 2 else None,
+                status='assembled' if number % 2 else 'raw',
+                total_price=200,
+            )
+            for number in range(count)
+        )
+        OrderDetails.objects.bulk_create(
+            OrderDetails(order=order, product=self.burger, quantity=2, price=100)
+            for order in orders
+        )
+
+    def test_number_of_queries_does_not_depend_on_orders_count(self):
+        for orders_count in [10, 100, 1000]:
+            with self.subTest(orders_count=orders_count):
+                Order.objects.all().delete()
+                AddressCache.objects.all().delete()
+                cache.clear()
+                geocode_cache.clear()
+                self.create_orders(orders_count)
+
+                with self.assertNumQueries(9):
+                    response = self.client.get(reverse('restaurateur:view_orders'))
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.context['order_items']),
+                    min(orders_count, settings.ORDERS_PAGE_SIZE),
+                )
+                self.assertEqual(response.context['order_items'][0]['total_price'], 200)
+
+
+class DeliveryRadiusTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        # Оба ресторана примерно в 3 км от заказа, но у второго радиус доставки 2 км
+        self.delivering = Restaurant.objects.create(
+            name='Доставит', address='Москва, Арбат 10', lat=55.751, lon=37.565, delivery_radius_km=5,
+        )
+        self.too_far = Restaurant.objects.create(
+            name='Не доставит', address='Москва, Тверская 20', lat=55.784, lon=37.613, delivery_radius_km=2,
+        )
+        for restaurant in [self.delivering, self.too_far]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=burger)
+        AddressCache.objects.create(address=normalize_address('Москва, Тверская 1'), lat=55.757, lon=37.613)
+        self.order = Order.objects.create(
+            address='Москва, Тверская 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+        )
+        OrderDetails.objects.create(order=self.order, product=burger, quantity=1, price=100)
+
+    def test_board_lists_only_restaurants_within_their_radius(self):
+        order_item, = build_order_items(Order.objects.prefetch_related('details'))
+
+        self.assertEqual([restaurant['restaurant_name'] for restaurant in order_item['restaurants']], ['Доставит'])
+        self.assertAlmostEqual(order_item['restaurants'][0]['distance'], 3, delta=0.5)
+
+    def test_grid_prefilter_matches_brute_force(self):
+        random = np.random.default_rng(0)
+        order_points = list(zip(random.uniform(37.35, 37.85, 200), random.uniform(55.57, 55.91, 200)))
+        restaurant_points = list(zip(random.uniform(37.35, 37.85, 40), random.uniform(55.57, 55.91, 40)))
+        radii = random.uniform(1, 15, 40)
+        can_cook = random.random((200, 40)) < 0.7
+
+        distances = compute_delivery_distances(order_points, restaurant_points, radii, can_cook)
+
+        expected = haversine_matrix(order_points, restaurant_points)
+        expected[~can_cook | (expected > radii)] = np.nan
+        np.testing.assert_allclose(distances, expected, equal_nan=True)
+
+
+@override_settings(ORDER_CHANGES_COMMIT_LAG=0)
+class OrderChangesTest(TestCase):
+    def setUp(self):
+        manager = User.objects.create_user('manager', is_staff=True)
+        self.client.force_login(manager)
+        AddressCache.objects.create(address='москва тверская 1', lat=55.757, lon=37.613)
+        self.orders = [
+            Order.objects.create(
+                address='Москва, Тверская 1',
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79001234567',
+            )
+            for _ in range(3)
+        ]
+
+    def get_changes(self, watermark):
+        response = self.client.get(reverse('restaurateur:order_changes'), watermark)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_orders_changed_after_watermark(self):
+        watermark = self.client.get(reverse('restaurateur:view_orders')).context['watermark']
+        self.assertEqual(self.get_changes(watermark)['orders'], [])
+
+        self.orders[0].comment = 'Позвонить заранее'
+        self.orders[0].save()
+
+        changes = self.get_changes(watermark)
+        self.assertEqual([order['id'] for order in changes['orders']], [self.orders[0].id])
+        self.assertEqual(self.get_changes(changes['watermark'])['orders'], [])
+
+    def test_orders_changed_while_board_is_built_are_reported(self):
+        def change_order(orders):
+            Order.objects.filter(id=self.orders[0].id).update(comment='Позвонить заранее', updated_at=timezone.now())
+            return build_order_items(orders)
+
+        with mock.patch('restaurateur.views.build_order_items', side_effect=change_order):
+            watermark = self.client.get(reverse('restaurateur:view_orders')).context['watermark']
+
+        self.assertEqual([order['id'] for order in self.get_changes(watermark)['orders']], [self.orders[0].id])
+
+    @override_settings(ORDER_CHANGES_COMMIT_LAG=10)
+    def test_late_commit_behind_watermark_is_reported(self):
+        started_at = timezone.now()
+        changes = self.get_changes(make_watermark(started_at - timedelta(hours=1), 0))
+        self.assertEqual(len(changes['orders']), 3)
+
+        # updated_at поставлен до того, как отдана отметка, а коммит случился после
+        Order.objects.filter(id=self.orders[1].id).update(updated_at=started_at - timedelta(seconds=3))
+
+        late_changes = self.get_changes(changes['watermark'])
+        self.assertIn(self.orders[1].id, [order['id'] for order in late_changes['orders']])
+
+    def test_rejects_invalid_watermark(self):
+        response = self.client.get(reverse('restaurateur:order_changes'), {'since': 'вчера'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportOrdersTest(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', is_staff=True)
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+
+    def create_orders(self, count, **fields):
+        orders = Order.objects.bulk_create(
+            Order(
+                address=f'Москва, Заказная {number}',
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79001234567',
+                comment='Позвонить за час до доставки, домофон не работает',
+                **fields,
+            )
+            for number in range(count)
+        )
+        OrderDetails.objects.bulk_create(
+            OrderDetails(order=order, product=product, quantity=2, price=product.price)
+            for order in orders
+            for product in [self.burger, self.fries]
+        )
+        return orders
+
+    def export(self, **params):
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('restaurateur:export_orders'), params)
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        return chunks, json.loads(b''.join(chunks))
+
+    def test_requires_manager(self):
+        response = self.client.get(reverse('restaurateur:export_orders'))
+        self.assertRedirects(response, reverse('restaurateur:login') + '?next=' + reverse('restaurateur:export_orders'))
+
+        self.client.force_login(User.objects.create_user('customer'))
+        response = self.client.get(reverse('restaurateur:export_orders'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_valid_json_across_chunks(self):
+        orders = self.create_orders(300)
+
+        chunks, exported = self.export()
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([order['id'] for order in exported], [order.id for order in orders])
+        self.assertEqual(
+            exported[0]['products'],
+            [
+                {'product': self.burger.id, 'quantity': 2, 'price': '100.00'},
+                {'product': self.fries.id, 'quantity': 2, 'price': '50.00'},
+            ],
+        )
+
+    def test_details_are_prefetched(self):
+        self.create_orders(10)
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse('restaurateur:export_orders'))
+
+        with self.assertNumQueries(2):
+            exported = json.loads(b''.join(response.streaming_content))
+        self.assertTrue(all(len(order['products']) == 2 for order in exported))
+
+    def test_filters_by_status(self):
+        self.create_orders(2)
+        assembled_orders = self.create_orders(3, status='assembled')
+
+        _, exported = self.export(status='assembled')
+        self.assertEqual([order['id'] for order in exported], [order.id for order in assembled_orders])
+
+        self.assertEqual(self.export(status='ready')[1], [])
+
+
+class ChooseRestaurantsTest(SimpleTestCase):
+    def test_respects_restaurant_capacity(self):
+        rankings = [[0, 1], [0, 1], [0], [1, 2], []]
+        capacities = [1, 1, None]
+
+        self.assertEqual(choose_restaurants(rankings, capacities), [0, 1, None, 2, None])
+
+
+class AssignRawOrdersTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        self.burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.fries = Product.objects.create(name='Картошка', price=50, image='fries.jpg')
+        self.near = Restaurant.objects.create(
+            name='Ближний',
+            address='Москва, Тверская 1',
+            lat=55.757,
+            lon=37.613,
+            max_active_orders=2,
+        )
+        self.far = Restaurant.objects.create(name='Дальний', address='Москва, Арбат 10', lat=55.751, lon=37.594)
+        for restaurant in [self.near, self.far]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.burger)
+        AddressCache.objects.create(address=normalize_address('Москва, Тверская 3'), lat=55.758, lon=37.612)
+
+        self.create_order(self.burger, restaurant=self.near, status='assembled')
+        self.raw_orders = [self.create_order(self.burger) for _ in range(2)]
+        self.uncookable_order = self.create_order(self.fries)
+
+    def create_order(self, product, **fields):
+        order = Order.objects.create(
+            address='Москва, Тверская 3',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+            **fields,
+        )
+        OrderDetails.objects.create(order=order, product=product, quantity=1, price=product.price)
+        return order
+
+    def test_assigns_nearest_restaurant_with_free_capacity(self):
+        self.assertEqual(assign_raw_orders(), (2, 1))
+
+        first, second = Order.objects.filter(id__in=[order.id for order in self.raw_orders]).order_by('id')
+        # У ближнего ресторана одно место из двух уже занято
+        self.assertEqual((first.restaurant, first.status), (self.near, 'assembled'))
+        self.assertEqual((second.restaurant, second.status), (self.far, 'assembled'))
+        self.assertIsNotNone(first.called_at)
+
+        self.uncookable_order.refresh_from_db()
+        self.assertEqual((self.uncookable_order.restaurant, self.uncookable_order.status), (None, 'raw'))
+
+        self.assertEqual(
+            set(
+                OrderStatusTransition.objects
+                .filter(from_status='raw', to_status='assembled')
+                .values_list('order', flat=True)
+            ),
+            {first.id, second.id},
+        )
+        self.assertEqual(assign_raw_orders(), (0, 1))
+
+    def test_skips_orders_processed_after_ranking(self):
+        def process_first_order(*args):
+            Order.objects.filter(id=self.raw_orders[0].id).update(status='assembled', restaurant=self.far)
+            return rank_restaurants(*args)
+
+        with mock.patch('restaurateur.assignment.rank_restaurants', side_effect=process_first_order):
+            self.assertEqual(assign_raw_orders(), (1, 1))
+
+        self.raw_orders[1].refresh_from_db()
+        self.assertEqual(self.raw_orders[1].restaurant, self.near)
+        self.assertFalse(OrderStatusTransition.objects.filter(order=self.raw_orders[0], to_status='assembled').exists())
+
+    def test_counts_places_taken_by_concurrent_run(self):
+        def take_last_place(*args):
+            self.create_order(self.burger, restaurant=self.near, status='assembled')
+            return rank_restaurants(*args)
+
+        with mock.patch('restaurateur.assignment.rank_restaurants', side_effect=take_last_place):
+            self.assertEqual(assign_raw_orders(), (2, 1))
+
+        self.assertEqual(
+            set(Order.objects.filter(id__in=[order.id for order in self.raw_orders]).values_list('restaurant', flat=True)),
+            {self.far.id},
+        )
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentAssignmentTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+        burger = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        self.near = Restaurant.objects.create(
+            name='Ближний', address='Москва, Тверская 1', lat=55.757, lon=37.613, max_active_orders=1,
+        )
+        far = Restaurant.objects.create(name='Дальний', address='Москва, Арбат 10', lat=55.751, lon=37.594)
+        for restaurant in [self.near, far]:
+            RestaurantMenuItem.objects.create(restaurant=restaurant, product=burger)
+        AddressCache.objects.create(address=normalize_address('Москва, Тверская 3'), lat=55.758, lon=37.612)
+        self.orders = []
+        for _ in range(2):
+            order = Order.objects.create(
+                address='Москва, Тверская 3',
+                firstname='Иван',
+                lastname='Петров',
+                phonenumber='+79001234567',
+            )
+            OrderDetails.objects.create(order=order, product=burger, quantity=1, price=100)
+            self.orders.append(order)
+
+    def test_concurrent_runs_do_not_overfill_restaurant(self):
+        ranked = threading.Barrier(2, timeout=10)
+
+        def rank_together(*args):
+            rankings = rank_restaurants(*args)
+            ranked.wait()
+            return rankings
+
+        def assign(order):
+            try:
+                assign_raw_orders(Order.objects.filter(id=order.id))
+            finally:
+                connection.close()
+
+        with mock.patch('restaurateur.assignment.rank_restaurants', side_effect=rank_together):
+            threads = [threading.Thread(target=assign, args=[order]) for order in self.orders]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(Order.objects.filter(restaurant=self.near).count(), 1)
+        self.assertEqual(Order.objects.filter(status='assembled').count(), 2)
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        AddressCache.objects.create(address=normalize_address('Москва, Тверская 1'), lat=55.757, lon=37.613)
+        self.order = Order.objects.create(
+            address='Москва, Тверская 1',
+            firstname='Иван',
+            lastname='Петров',
+            phonenumber='+79001234567',
+        )
+
+    def test_saved_order_is_published_after_commit(self):
+        with mock.patch.object(order_events, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.order.save()
+        publish.assert_called_once_with([self.order.id])
+
+    def test_payload_is_built_once_for_all_subscribers(self):
+        broadcaster = OrderEventsBroadcaster()
+        subscribers = [Subscriber() for _ in range(20)]
+        broadcaster.subscribers.update(subscribers)
+
+        with mock.patch.object(broadcaster, 'build_payload', wraps=broadcaster.build_payload) as build_payload:
+            broadcaster.broadcast([self.order.id])
+
+        build_payload.assert_called_once()
+        payloads = {subscriber.queue.get_nowait() for subscriber in subscribers}
+        self.assertEqual(len(payloads), 1)
+        self.assertEqual(json.loads(payloads.pop())['orders'][0]['id'], self.order.id)
@@ -1,20 +1,30 @@
-from collections import defaultdict
 import logging
 
 from django import forms
-from django.db.models import Prefetch
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy
-from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
-from geopy import distance
-import requests
 
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem, OrderDetails
-from locations.models import AddressCache
+from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.streaming import stream_queryset_as_json
+from restaurateur.events import aiter_order_events, iter_order_events
+from restaurateur.board import (
+    build_order_items,
+    get_board_orders,
+    get_changed_orders,
+    get_orders_watermark,
+    make_committed_watermark,
+    make_watermark,
+    serialize_order,
+    serialize_order_changes,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -37,6 +47,55 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilter(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус',
+        required=False,
+        choices=[('', 'Все, кроме готовых'), *Order.PROCESSING_STATUS_CHOICES],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    date_from = forms.DateField(
+        label='С',
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    date_to = forms.DateField(
+        label='По',
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    price_from = forms.DecimalField(
+        label='Стоимость от',
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    price_to = forms.DecimalField(
+        label='до',
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    ordering = forms.ChoiceField(
+        label='Сортировка',
+        required=False,
+        choices=[
+            ('', 'По статусу'),
+            ('total_price', 'Сначала дешёвые'),
+            ('-total_price', 'Сначала дорогие'),
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+
+class OrderChangesFilter(forms.Form):
+    since = forms.DateTimeField()
+    after_id = forms.IntegerField(min_value=0, required=False)
+
+    def clean_after_id(self):
+        return self.cleaned_data['after_id'] or 0
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -101,99 +160,59 @@ def view_restaurants(request):
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    geo_apikey = settings.GEO_API_KEY
-
-    orders = Order.objects.total_price().exclude(status='ready').prefetch_related(
-        Prefetch('details', queryset=OrderDetails.objects.select_related('product'))
-    ).order_by('-status')
-    restaurant_items = RestaurantMenuItem.objects.select_related('restaurant', 'product').filter(availability=True)
-
-    products_in_restaurant = defaultdict(set)
-    for item in restaurant_items:
-        products_in_restaurant[item.product].add(item.restaurant)
-
-    order_items = []
-    for order in orders:
-        order_products = [detail.product for detail in order.details.all()]
-
-        if not order_products:
-            available_restaurants = []
-        else:
-            restaurants_for_products = [
-                products_in_restaurant[product] for product in order_products
-            ]
-
-            available_restaurants = set.intersection(*restaurants_for_products)
-
-        order_coords = fetch_coordinates(geo_apikey, order.address)
-
-        restaurant_with_distance = []
-        for restaurant in available_restaurants:
-            restaurant_coords = fetch_coordinates(geo_apikey, restaurant.address)
-
-            if restaurant_coords and order_coords:
-                restaurant_with_distance.append({
-                    'restaurant_name': restaurant.name,
-                    'distance': round(distance.distance(order_coords, restaurant_coords).km, 2)
-                })
-        sorted_restaurants = sorted(restaurant_with_distance, key=lambda restaurant: restaurant['distance'])
-        order_items.append({
-            'order': order,
-            'restaurants': sorted_restaurants,
-        })
+    # Отметка берётся до выборки: заказы, изменённые пока строится доска,
+    # придут при следующем запросе изменений
+    watermark = get_orders_watermark()
+    form = OrdersFilter(request.GET)
+    filters = form.cleaned_data if form.is_valid() else {}
+    orders = get_board_orders(**filters)
+    page = Paginator(orders, settings.ORDERS_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    query = request.GET.copy()
+    query.pop('page', None)
     return render(request, 'order_items.html', {
-        'order_items': order_items,
+        'order_items': build_order_items(page.object_list),
+        'page': page,
+        'form': form,
+        'filter_query': query.urlencode(),
+        'watermark': watermark,
     })
 
 
-def fetch_coordinates(geo_apikey, address):
-    if not address:
-        return None
-
-    try:
-        cached = AddressCache.objects.get(address=address)
-        if cached.lat is None or cached.lon is None:
-            return None
-        return (float(cached.lon), float(cached.lat))
-    except AddressCache.DoesNotExist:
-        pass
-
-    result = get_coordinates_from_api(geo_apikey, address)
-    if not result:
-        AddressCache.objects.create(address=address, lat=None, lon=None)
-        return None
-
-    lon, lat = result
-    try:
-        lon_float = float(lon)
-        lat_float = float(lat)
-    except (TypeError, ValueError):
-        return None
-
-    AddressCache.objects.create(address=address, lat=lat_float, lon=lon_float)
-    return (lon_float, lat_float)
-
-
-def get_coordinates_from_api(geo_apikey, address):
-    try:
-        base_url = "https://geocode-maps.yandex.ru/1.x"
-        response = requests.get(base_url, params={
-            "geocode": address,
-            "apikey": geo_apikey,
-            "format": "json",
-            },
-            timeout=5
-        )
-        response.raise_for_status()
-        found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_changes(request):
+    form = OrderChangesFilter(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
 
-        if not found_places:
-            return None
+    orders = list(get_changed_orders(**form.cleaned_data)[:settings.ORDERS_PAGE_SIZE])
+    if orders:
+        watermark = make_committed_watermark(orders[-1].updated_at, orders[-1].id)
+    else:
+        watermark = make_watermark(**form.cleaned_data)
 
-        most_relevant = found_places[0]
-        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-        return lon, lat
+    return JsonResponse({
+        'orders': serialize_order_changes(orders),
+        'watermark': watermark,
+    }, json_dumps_params={'ensure_ascii': False})
 
-    except requests.exceptions.RequestException as e:
-        logger.error(e)
-        return None
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def stream_order_events(request):
+    if isinstance(request, ASGIRequest):
+        events = aiter_order_events()
+    else:
+        events = iter_order_events()
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def export_orders(request):
+    orders = Order.objects.prefetch_related('details').order_by('id')
+    status = request.GET.get('status')
+    if status:
+        orders = orders.filter(status=status)
+    return stream_queryset_as_json(orders, serialize_order)
@@ -91,6 +91,25 @@ DATABASES = {
     ),
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', default='locmem://'),
+}
+AVAILABILITY_INDEX_CACHE_TIMEOUT = env.int('AVAILABILITY_INDEX_CACHE_TIMEOUT', 300)
+CATALOGUE_CACHE_TIMEOUT = env.int('CATALOGUE_CACHE_TIMEOUT', 300)
+STREAMING_CHUNK_SIZE = env.int('STREAMING_CHUNK_SIZE', 2000)
+ORDERS_PAGE_SIZE = env.int('ORDERS_PAGE_SIZE', 50)
+# Отметка изменений заказов отстаёт от текущего времени на столько секунд:
+# updated_at ставится до коммита, и поздно закоммиченная правка не должна потеряться
+ORDER_CHANGES_COMMIT_LAG = env.int('ORDER_CHANGES_COMMIT_LAG', 10)
+ORDERS_BATCH_MAX_SIZE = env.int('ORDERS_BATCH_MAX_SIZE', 500)
+IDEMPOTENCY_KEY_TTL_DAYS = env.int('IDEMPOTENCY_KEY_TTL_DAYS', 7)
+ORDER_EVENTS_BATCH_DELAY = env.float('ORDER_EVENTS_BATCH_DELAY', 0.5)
+ORDER_EVENTS_KEEPALIVE = env.int('ORDER_EVENTS_KEEPALIVE', 20)
+# Асинхронные версии публичного API для запуска под ASGI-сервером
+ASYNC_API = env.bool('ASYNC_API', False)
+DEFAULT_DELIVERY_RADIUS_KM = env.float('DEFAULT_DELIVERY_RADIUS_KM', 15)
+DELIVERY_GRID_CELL_KM = env.float('DELIVERY_GRID_CELL_KM', 5)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -171,6 +190,28 @@ LOGGING = {
 }
 
 GEO_API_KEY = env.str('GEO_API_KEY')
+GEOCODER_GAZETTEER_PATH = env.str('GEOCODER_GAZETTEER_PATH', '')
+GEOCODER_BACKENDS = env.list('GEOCODER_BACKENDS', [
+    *(['locations.backends.GazetteerGeocoder'] if GEOCODER_GAZETTEER_PATH else []),
+    'locations.backends.YandexGeocoder',
+])
+YANDEX_GEOCODER_URL = env.str('YANDEX_GEOCODER_URL', 'https://geocode-maps.yandex.ru/1.x')
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 8)
+GEOCODER_MAX_IN_FLIGHT = env.int('GEOCODER_MAX_IN_FLIGHT', 8)
+GEOCODER_CIRCUIT_FAILURE_THRESHOLD = env.int('GEOCODER_CIRCUIT_FAILURE_THRESHOLD', 5)
+GEOCODER_CIRCUIT_RECOVERY_TIMEOUT = env.int('GEOCODER_CIRCUIT_RECOVERY_TIMEOUT', 60)
+GEOCODE_IN_BACKGROUND = env.bool('GEOCODE_IN_BACKGROUND', True)
+GEOCODER_CACHE_SIZE = env.int('GEOCODER_CACHE_SIZE', 10000)
+GEOCODER_CACHE_TTL = env.int('GEOCODER_CACHE_TTL', 60 * 60)
+GEOCODER_NEGATIVE_CACHE_TTL = env.int('GEOCODER_NEGATIVE_CACHE_TTL', 5 * 60)
+GEOCODER_SHARED_CACHE = env.str('GEOCODER_SHARED_CACHE', '')
+GEOCODER_STORED_TTL = {
+    'ok': env.int('GEOCODER_OK_TTL', 90 * 24 * 60 * 60),
+    'not_found': env.int('GEOCODER_NOT_FOUND_TTL', 7 * 24 * 60 * 60),
+    'transient_error': env.int('GEOCODER_TRANSIENT_ERROR_TTL', 10 * 60),
+}
+GEOCODER_REFRESH_RATE = env.float('GEOCODER_REFRESH_RATE', 5)
 
 ROLLBAR = {
     'access_token': env.str('ROLLBAR_TOKEN', ''),